@@ -0,0 +1,221 @@
+"""Admission control for upstream LLM streams.
+
+A message may only open an OpenAI stream while it holds a slot. Slots are
+limited per process (LLM_MAX_CONCURRENCY) and, through a Redis lease set,
+across the cluster (LLM_CLUSTER_MAX_CONCURRENCY). Requests over the process
+limit wait in a bounded FIFO queue and are told their position; when the
+queue is full, or no slot frees up within LLM_QUEUE_TIMEOUT, they are
+rejected straight away with a retry_after estimate instead of piling onto
+an upstream that is already returning 429s.
+
+Cluster leases expire after LLM_SLOT_TTL so a crashed worker cannot hold
+slots forever. If Redis is unreachable, only the process limit applies.
+"""
+
+import asyncio
+import logging
+import math
+import time
+import uuid
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+from chat.metrics import ADMISSION_REJECTED, ADMISSION_WAIT_SECONDS, LLM_ACTIVE_STREAMS, LLM_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_KEY = "llm:slots"
+
+# KEYS[1]: lease set. ARGV: now, limit, lease expiry, lease token, key ttl (ms).
+ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+    redis.call('PEXPIRE', KEYS[1], ARGV[5])
+    return 1
+end
+return 0
+"""
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"LLM queue is full; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class _LoopState:
+    def __init__(self):
+        self.active = 0
+        self.waiters = deque()
+
+
+class AdmissionController:
+    POSITION_UPDATE_INTERVAL = 1.0
+
+    def __init__(self, redis_url=None):
+        self.redis_url = redis_url
+        self._states = weakref.WeakKeyDictionary()
+        self._scripts = weakref.WeakKeyDictionary()
+        # Moving average of how long a slot is held, for retry_after.
+        self._hold_seconds = 5.0
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = _LoopState()
+        return state
+
+    def retry_after(self, waiting):
+        limit = max(1, settings.LLM_MAX_CONCURRENCY)
+        return max(1, math.ceil(self._hold_seconds * (waiting + 1) / limit))
+
+    @asynccontextmanager
+    async def slot(self, notify=None):
+        """Hold an LLM slot for the duration of the block.
+
+        ``notify(position)`` is awaited whenever the caller's place in the
+        process queue changes. Raises AdmissionRejected when the request
+        cannot be admitted.
+        """
+        started = time.monotonic()
+        deadline = started + settings.LLM_QUEUE_TIMEOUT
+        await self._acquire_local(notify, deadline)
+        lease = None
+        try:
+            lease = await self._acquire_cluster(deadline)
+            ADMISSION_WAIT_SECONDS.observe(time.monotonic() - started)
+            LLM_ACTIVE_STREAMS.inc()
+            held_from = time.monotonic()
+            try:
+                yield
+            finally:
+                LLM_ACTIVE_STREAMS.dec()
+                self._hold_seconds = 0.9 * self._hold_seconds + 0.1 * (time.monotonic() - held_from)
+        finally:
+            if lease is not None:
+                await self._release_cluster(lease)
+            self._release_local()
+
+    async def _acquire_local(self, notify, deadline):
+        state = self._state()
+        if state.active < settings.LLM_MAX_CONCURRENCY and not state.waiters:
+            state.active += 1
+            return
+        if len(state.waiters) >= settings.LLM_MAX_QUEUE:
+            ADMISSION_REJECTED.inc(reason="queue_full")
+            raise AdmissionRejected(self.retry_after(len(state.waiters)))
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = [future, notify, time.monotonic()]
+        state.waiters.append(waiter)
+        LLM_QUEUE_DEPTH.inc()
+        try:
+            if notify is not None:
+                await notify(len(state.waiters))
+            await asyncio.wait_for(asyncio.shield(future), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            if not future.done():
+                self._leave_queue(state, waiter)
+                ADMISSION_REJECTED.inc(reason="timeout")
+                raise AdmissionRejected(self.retry_after(len(state.waiters))) from None
+            # Handed a slot right at the deadline: keep it.
+        except BaseException:
+            if future.done():
+                self._release_local()
+            else:
+                self._leave_queue(state, waiter)
+            raise
+        # _release_local handed its slot over, so active already counts it.
+
+    def _leave_queue(self, state, waiter):
+        state.waiters.remove(waiter)
+        LLM_QUEUE_DEPTH.dec()
+        self._announce_positions(state)
+
+    def _release_local(self):
+        state = self._state()
+        if state.waiters:
+            future, _, _ = state.waiters.popleft()
+            LLM_QUEUE_DEPTH.dec()
+            future.set_result(None)
+            self._announce_positions(state)
+        else:
+            state.active -= 1
+
+    def _announce_positions(self, state):
+        # Every release moves the whole queue; tell each waiter at most once
+        # per POSITION_UPDATE_INTERVAL, except when it reaches the front.
+        now = time.monotonic()
+        for position, waiter in enumerate(state.waiters, start=1):
+            _, notify, announced_at = waiter
+            if notify is None:
+                continue
+            if position == 1 or now - announced_at >= self.POSITION_UPDATE_INTERVAL:
+                waiter[2] = now
+                asyncio.ensure_future(self._notify(notify, position))
+
+    async def _notify(self, notify, position):
+        try:
+            await notify(position)
+        except Exception:
+            # The client may have gone away; its waiter is cleaned up by the
+            # cancelled receive.
+            logger.debug("Queue position update failed", exc_info=True)
+
+    def _script(self):
+        loop = asyncio.get_running_loop()
+        script = self._scripts.get(loop)
+        if script is None:
+            client = redis.asyncio.Redis.from_url(
+                self.redis_url,
+                socket_timeout=0.25,
+                socket_connect_timeout=0.25,
+            )
+            script = self._scripts[loop] = client.register_script(ACQUIRE_SCRIPT)
+        return script
+
+    async def _acquire_cluster(self, deadline):
+        limit = settings.LLM_CLUSTER_MAX_CONCURRENCY
+        if not limit or not self.redis_url:
+            return None
+        token = uuid.uuid4().hex
+        ttl = settings.LLM_SLOT_TTL
+        while True:
+            now = time.time()
+            try:
+                acquired = await self._script()(
+                    keys=[CLUSTER_KEY],
+                    args=[repr(now), limit, repr(now + ttl), token, int(ttl * 1000) + 1000],
+                )
+            except redis.RedisError:
+                logger.warning("Cluster LLM slot check failed; using the process limit only", exc_info=True)
+                return None
+            if acquired:
+                return token
+            if time.monotonic() >= deadline:
+                ADMISSION_REJECTED.inc(reason="cluster_timeout")
+                raise AdmissionRejected(self.retry_after(0))
+            await asyncio.sleep(settings.LLM_SLOT_POLL_INTERVAL)
+
+    async def _release_cluster(self, token):
+        try:
+            await self._script().registered_client.zrem(CLUSTER_KEY, token)
+        except redis.RedisError:
+            logger.warning("Could not release cluster LLM slot; it expires in %ss", settings.LLM_SLOT_TTL)
+
+
+_controller = None
+
+
+def get_admission_controller():
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController(settings.REDIS_URL)
+    return _controller
@@ -1,32 +1,65 @@
+import asyncio
 import json
+import logging
 import time
-from collections import deque
 
 from asgiref.sync import sync_to_async
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.apps import apps
 from django.conf import settings
-from openai import AsyncOpenAI
+from django.db import transaction
 
-from rag.prompts import SYSTEM_PROMPT
-from rag.retrieval import retrieve_context
+from chat.admission import AdmissionRejected, get_admission_controller
+from chat.history import prompt_history, render_message
+from chat.metrics import (
+    ACTIVE_CONNECTIONS,
+    ANSWER_BYTES,
+    ANSWER_FRAMES,
+    CONTEXT_TOKENS,
+    MESSAGES,
+    RATE_LIMITED,
+    STAGE_SECONDS,
+    TIME_TO_FIRST_TOKEN,
+)
+from chat.streaming import DeltaCoalescer
+from chat.tasks import update_session_summary
+from core.openai_client import async_openai
+from core.ratelimit import buckets_for, get_rate_limiter, scope_ip
+from rag.cache import get_answer_cache
+from rag.packing import pack_context
+from rag.prompts import NO_ANSWER_REPLY, SYSTEM_PROMPT
+from rag.retrieval import aembed_query, aretrieve_context, get_retrieval_executor
+from rag.store import get_generation
+
+logger = logging.getLogger(__name__)
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
-    RATE_LIMIT_WINDOW_SECONDS = 30
-    RATE_LIMIT_MAX_MESSAGES = 6
+    REPLAY_CHUNK_CHARS = 48
 
     async def connect(self):
         if self.scope["user"].is_anonymous:
             await self.close(code=4401)
             return
 
-        self._message_times = deque()
+        self._received_at = None
         await self.accept()
+        self._counted = True
+        ACTIVE_CONNECTIONS.inc()
         await self.send(text_data=json.dumps({"type": "status", "message": "connected"}))
 
+    async def disconnect(self, code):
+        if getattr(self, "_counted", False):
+            self._counted = False
+            ACTIVE_CONNECTIONS.dec()
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        with STAGE_SECONDS.time(stage="send"):
+            await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
     async def receive(self, text_data=None, bytes_data=None):
+        self._received_at = time.perf_counter()
         if not text_data:
             await self.send(text_data=json.dumps({"type": "error", "error": "empty_payload"}))
             return
@@ -37,13 +70,16 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.send(text_data=json.dumps({"type": "error", "error": "invalid_json"}))
             return
 
-        if self._is_rate_limited():
+        retry_after = await self._check_rate_limit()
+        if retry_after:
+            RATE_LIMITED.inc()
+            MESSAGES.inc(outcome="rate_limited")
             await self.send(
                 text_data=json.dumps(
                     {
                         "type": "error",
                         "error": "rate_limited",
-                        "retry_after": self.RATE_LIMIT_WINDOW_SECONDS,
+                        "retry_after": retry_after,
                     }
                 )
             )
@@ -65,61 +101,163 @@ class ChatConsumer(AsyncWebsocketConsumer):
             )
             return
 
-        session_id = payload.get("session_id")
-        session = await self._get_or_create_session(session_id)
-        user_message = await self._create_message(session, "user", message)
-        history = await self._get_recent_messages(session, exclude_id=user_message.id)
+        # Retrieval only needs the message text, so it starts right away and
+        # overlaps the database round trip. The query embedding is shared with
+        # the answer cache lookup.
+        embedding_task = None
+        if settings.CHAT_ANSWER_CACHE_ENABLED:
+            embedding_task = asyncio.create_task(aembed_query(message))
+        retrieval_task = asyncio.create_task(self._retrieve(message, embedding_task))
+        try:
+            with STAGE_SECONDS.time(stage="database"):
+                session, history, omitted = await self._start_turn(payload.get("session_id"), message)
+            await self.send(
+                text_data=json.dumps(
+                    {
+                        "type": "session",
+                        "session_id": session.id,
+                    }
+                )
+            )
+
+            # Cached answers only apply to standalone questions; follow-ups
+            # depend on the conversation and must go to the model.
+            use_answer_cache = embedding_task is not None and not history and not session.summary
+            embedding = None
+            generation = None
+            if use_answer_cache:
+                generation = get_generation()
+                with STAGE_SECONDS.time(stage="answer_cache"):
+                    embedding = await embedding_task
+                    cached_answer = get_answer_cache().lookup(embedding, generation)
+                if cached_answer:
+                    retrieval_task.cancel()
+                    await self._replay_answer(session, cached_answer)
+                    MESSAGES.inc(outcome="cached")
+                    return
+
+            with STAGE_SECONDS.time(stage="retrieve_wait"):
+                context_chunks = await retrieval_task
+        finally:
+            for task in (embedding_task, retrieval_task):
+                if task is not None and not task.done():
+                    task.cancel()
+
+        # Nothing in the corpus is relevant, so the model could only reply
+        # NO_ANSWER_REPLY. Follow-ups still go to the model: their answer
+        # may be in the conversation.
+        if not context_chunks and not history and not session.summary and settings.CHAT_NO_ANSWER_FAST_PATH:
+            await self._replay_answer(session, NO_ANSWER_REPLY)
+            MESSAGES.inc(outcome="no_answer")
+            return
 
-        context_chunks = await sync_to_async(retrieve_context)(message)
         context_block = "\n\n".join(context_chunks) if context_chunks else ""
-        history_block = "\n".join(
-            f"{item.role}: {item.content}" for item in history
-        )
+        history_block = "\n".join(render_message(item) for item in history)
 
         system_message = SYSTEM_PROMPT
         if context_block:
             system_message = f"{system_message}\n\nContext:\n{context_block}"
+        if session.summary:
+            system_message = f"{system_message}\n\nConversation summary:\n{session.summary}"
         if history_block:
             system_message = f"{system_message}\n\nConversation history:\n{history_block}"
 
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "session",
-                    "session_id": session.id,
-                }
+        try:
+            async with get_admission_controller().slot(notify=self._send_queued):
+                assistant_text = await self._stream_answer(session, system_message, message)
+        except AdmissionRejected as exc:
+            MESSAGES.inc(outcome="rejected")
+            await self.send(
+                text_data=json.dumps(
+                    {
+                        "type": "error",
+                        "error": "busy",
+                        "retry_after": exc.retry_after,
+                    }
+                )
+            )
+            return
+        MESSAGES.inc(outcome="answered" if assistant_text else "failed")
+        if use_answer_cache and assistant_text:
+            get_answer_cache().store(embedding, assistant_text, generation)
+        if omitted and assistant_text:
+            await self._schedule_summary(session.id)
+
+    async def _schedule_summary(self, session_id):
+        # Messages fell out of the history budget; fold them into the
+        # session summary off the request path. Publishing touches no
+        # database, so it stays off the thread the ORM calls share.
+        try:
+            await sync_to_async(update_session_summary.delay, thread_sensitive=False)(session_id)
+        except Exception:
+            logger.warning("Could not queue summary update for session %s", session_id, exc_info=True)
+
+    async def _send_queued(self, position):
+        await self.send(text_data=json.dumps({"type": "status", "message": "queued", "position": position}))
+
+    async def _retrieve(self, message, embedding_task=None):
+        with STAGE_SECONDS.time(stage="retrieve"):
+            embedding = await embedding_task if embedding_task is not None else None
+            chunks = await aretrieve_context(message, embedding=embedding)
+        with STAGE_SECONDS.time(stage="pack_context"):
+            # Shingling and token counts are a few milliseconds of CPU; keep
+            # them off the event loop.
+            loop = asyncio.get_running_loop()
+            packed, stats = await loop.run_in_executor(
+                get_retrieval_executor(), pack_context, [chunk.text for chunk in chunks]
             )
+        CONTEXT_TOKENS.observe(stats["tokens_before"], stage="retrieved")
+        CONTEXT_TOKENS.observe(stats["tokens_after"], stage="packed")
+        return packed
+
+    async def _replay_answer(self, session, answer):
+        TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - self._received_at)
+        deltas = self._coalescer()
+        for start in range(0, len(answer), self.REPLAY_CHUNK_CHARS):
+            await deltas.add(answer[start:start + self.REPLAY_CHUNK_CHARS])
+        await self._close_deltas(deltas)
+        await self._create_message(session, "assistant", answer)
+        await self.send(text_data=json.dumps({"type": "done"}))
+
+    def _coalescer(self):
+        return DeltaCoalescer(
+            self.send,
+            interval=settings.CHAT_STREAM_FLUSH_INTERVAL_MS / 1000,
+            max_bytes=settings.CHAT_STREAM_FLUSH_BYTES,
         )
 
-        await self._stream_answer(session, system_message, message)
+    async def _close_deltas(self, deltas):
+        await deltas.close()
+        ANSWER_FRAMES.observe(deltas.frames)
+        ANSWER_BYTES.observe(deltas.bytes)
 
     async def _stream_answer(self, session, system_message, message):
-        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        assistant_text = ""
+        parts = []
+        deltas = self._coalescer()
+        requested_at = time.perf_counter()
 
         try:
-            stream = await client.chat.completions.create(
-                model=settings.OPENAI_CHAT_MODEL,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": message},
-                ],
-                stream=True,
-            )
+            async with async_openai() as client:
+                stream = await client.chat.completions.create(
+                    model=settings.OPENAI_CHAT_MODEL,
+                    messages=[
+                        {"role": "system", "content": system_message},
+                        {"role": "user", "content": message},
+                    ],
+                    stream=True,
+                )
 
-            async for event in stream:
-                delta = event.choices[0].delta.content or ""
-                if delta:
-                    assistant_text += delta
-                    await self.send(
-                        text_data=json.dumps(
-                            {
-                                "type": "delta",
-                                "content": delta,
-                            }
-                        )
-                    )
+                async for event in stream:
+                    delta = event.choices[0].delta.content or ""
+                    if delta:
+                        if not parts:
+                            now = time.perf_counter()
+                            STAGE_SECONDS.observe(now - requested_at, stage="llm_first_token")
+                            TIME_TO_FIRST_TOKEN.observe(now - self._received_at)
+                        parts.append(delta)
+                        await deltas.add(delta)
         except Exception:
+            await self._close_deltas(deltas)
             await self.send(
                 text_data=json.dumps(
                     {
@@ -128,43 +266,49 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     }
                 )
             )
-            return
+            return ""
 
+        await self._close_deltas(deltas)
+        STAGE_SECONDS.observe(time.perf_counter() - requested_at, stage="llm_stream")
+        assistant_text = "".join(parts)
         if assistant_text:
-            await self._create_message(session, "assistant", assistant_text)
+            with STAGE_SECONDS.time(stage="save_assistant_message"):
+                await self._create_message(session, "assistant", assistant_text)
             await self.send(text_data=json.dumps({"type": "done"}))
+        return assistant_text
 
     @database_sync_to_async
-    def _get_or_create_session(self, session_id):
+    def _start_turn(self, session_id, message):
+        """Resolve the session, read its history and save the user message in
+        one database hop. History is read before the insert, so it never
+        contains the message being answered.
+
+        Returns the session, the history that fits CHAT_HISTORY_TOKEN_BUDGET
+        and how many unsummarized messages were left out of it."""
         ChatSession = apps.get_model("chat", "ChatSession")
-        if session_id:
-            try:
-                return ChatSession.objects.get(id=session_id, user=self.scope["user"])
-            except ChatSession.DoesNotExist:
-                pass
-        return ChatSession.objects.create(user=self.scope["user"])
+        Message = apps.get_model("chat", "Message")
+        with transaction.atomic():
+            session = None
+            if session_id:
+                session = ChatSession.objects.filter(id=session_id, user=self.scope["user"]).first()
+            if session is None:
+                session = ChatSession.objects.create(user=self.scope["user"])
+                history, omitted = [], 0
+            else:
+                history, omitted = prompt_history(session)
+            Message.objects.create(session=session, role=Message.ROLE_USER, content=message)
+        return session, history, omitted
 
     @database_sync_to_async
     def _create_message(self, session, role, content):
         Message = apps.get_model("chat", "Message")
         return Message.objects.create(session=session, role=role, content=content)
 
-    @database_sync_to_async
-    def _get_recent_messages(self, session, exclude_id=None, limit=5):
-        Message = apps.get_model("chat", "Message")
-        queryset = Message.objects.filter(session=session)
-        if exclude_id:
-            queryset = queryset.exclude(id=exclude_id)
-        return list(queryset.order_by("-timestamp")[:limit][::-1])
-
-    def _is_rate_limited(self):
-        now = time.monotonic()
-        window_start = now - self.RATE_LIMIT_WINDOW_SECONDS
-        while self._message_times and self._message_times[0] < window_start:
-            self._message_times.popleft()
-
-        if len(self._message_times) >= self.RATE_LIMIT_MAX_MESSAGES:
-            return True
-
-        self._message_times.append(now)
-        return False
+    async def _check_rate_limit(self):
+        """Seconds to wait before the next message, or None if allowed now.
+
+        Buckets are per user and per client IP (core.ratelimit.scope_ip) and
+        live in Redis, so they apply across sockets and worker processes.
+        """
+        buckets = buckets_for("chat", user=self.scope["user"], ip=scope_ip(self.scope))
+        return await get_rate_limiter().acheck("chat", buckets)
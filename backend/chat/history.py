@@ -0,0 +1,109 @@
+"""Conversation history that fits a token budget, plus a rolling summary.
+
+The prompt carries the newest messages whose text fits
+CHAT_HISTORY_TOKEN_BUDGET tokens. Messages that no longer fit are folded
+into ChatSession.summary by summarize_session, which runs in Celery after
+an answer, so older context survives in at most CHAT_SUMMARY_MAX_TOKENS.
+"""
+
+import copy
+import logging
+
+from django.conf import settings
+
+from chat.models import ChatSession
+from core.openai_client import get_client
+from rag.prompts import SUMMARY_PROMPT
+from rag.tokens import count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Cap on a single message when it is sent to the summarizer.
+SUMMARY_INPUT_MESSAGE_TOKENS = 500
+SUMMARY_BATCH_MESSAGES = 50
+
+
+def render_message(message):
+    return f"{message.role}: {message.content}"
+
+
+def select_history(messages, budget, max_messages=None):
+    """Take messages, newest first, while their lines fit ``budget`` tokens
+    and there are at most ``max_messages`` of them.
+
+    Returns the kept messages oldest first and how many were left out. A
+    newest message that is larger than the whole budget is cut down rather
+    than dropped; the returned copy is never saved.
+    """
+    kept = []
+    used = 0
+    for message in messages:
+        if max_messages is not None and len(kept) >= max_messages:
+            break
+        # +1 for the newline that joins the lines.
+        tokens = count_tokens(render_message(message)) + 1
+        if used + tokens > budget:
+            if not kept and budget > 0:
+                message = copy.copy(message)
+                message.content = truncate_tokens(message.content, budget - count_tokens(f"{message.role}: ") - 1)
+                kept.append(message)
+            break
+        kept.append(message)
+        used += tokens
+    return kept[::-1], len(messages) - len(kept)
+
+
+def prompt_history(session):
+    """The session's history for the prompt, oldest first, and how many
+    unsummarized messages did not fit."""
+    # One row more than can be used, so a full window still reports that
+    # something was left out.
+    messages = list(
+        session.messages.filter(id__gt=session.summarized_until_id).order_by("-timestamp", "-id")[
+            : settings.CHAT_HISTORY_MAX_MESSAGES + 1
+        ]
+    )
+    return select_history(messages, settings.CHAT_HISTORY_TOKEN_BUDGET, settings.CHAT_HISTORY_MAX_MESSAGES)
+
+
+def summarize_session(session_id):
+    """Fold messages that fell out of the history window into the summary."""
+    session = ChatSession.objects.filter(id=session_id).first()
+    if session is None:
+        return {"folded": 0}
+
+    window, _ = prompt_history(session)
+    pending = session.messages.filter(id__gt=session.summarized_until_id)
+    if window:
+        pending = pending.filter(id__lt=window[0].id)
+    pending = list(pending.order_by("timestamp", "id")[:SUMMARY_BATCH_MESSAGES])
+    if not pending:
+        return {"folded": 0}
+
+    transcript = "\n".join(
+        f"{message.role}: {truncate_tokens(message.content, SUMMARY_INPUT_MESSAGE_TOKENS)}" for message in pending
+    )
+    response = get_client().chat.completions.create(
+        model=settings.CHAT_SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {
+                "role": "user",
+                "content": f"Current summary:\n{session.summary or '(none)'}\n\nNew messages:\n{transcript}",
+            },
+        ],
+        max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS,
+        temperature=0,
+    )
+    summary = truncate_tokens((response.choices[0].message.content or "").strip(), settings.CHAT_SUMMARY_MAX_TOKENS)
+
+    # Another run may have folded the same messages meanwhile; only the
+    # first write wins.
+    updated = ChatSession.objects.filter(id=session.id, summarized_until_id=session.summarized_until_id).update(
+        summary=summary,
+        summarized_until_id=pending[-1].id,
+    )
+    if not updated:
+        logger.info("Summary for session %s changed while summarizing; skipped", session.id)
+        return {"folded": 0}
+    return {"folded": len(pending), "summary_tokens": count_tokens(summary)}
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chat.retention import archive_stale_sessions
+
+
+class Command(BaseCommand):
+    help = "Move chat sessions idle for more than CHAT_RETENTION_DAYS into compressed archive storage."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.CHAT_RETENTION_DAYS)
+        parser.add_argument("--batch-size", type=int, default=settings.CHAT_RETENTION_BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        stats = archive_stale_sessions(
+            days=options["days"],
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+        )
+        if options["dry_run"]:
+            self.stdout.write(f"Would archive {stats['sessions']} sessions ({stats['messages']} messages).")
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {stats['sessions']} sessions ({stats['messages']} messages, "
+                f"{stats['bytes']} compressed bytes)."
+            )
+        )
@@ -0,0 +1,395 @@
+import asyncio
+import importlib
+import json
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from unittest import mock
+
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chat.history import summarize_session
+from chat.tasks import update_session_summary
+from core.fake_openai import FakeOpenAIServer
+from core.openai_client import aclose_clients
+from rag.store import get_runtime
+
+BENCH_USER_PREFIX = "bench-user-"
+QUESTIONS = [
+    "How do I reset my password?",
+    "What file types can I upload?",
+    "Where can I see my previous chats?",
+    "What does error E-1042 mean?",
+    "How long are uploaded documents kept?",
+]
+
+
+def prompt_chars_per_request(results):
+    upstream = results.get("upstream", {})
+    streams = upstream.get("chat", 0) - upstream.get("completions", 0)
+    if "prompt_chars" not in upstream or not streams:
+        return None
+    return upstream["prompt_chars"] / streams
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": statistics.mean(values) * 1000,
+        "p50_ms": percentile(values, 0.50) * 1000,
+        "p90_ms": percentile(values, 0.90) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+        "max_ms": max(values) * 1000,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test core.asgi.application: N authenticated websockets go through "
+        "JwtAuthMiddleware to ChatConsumer against a local fake OpenAI server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50, help="Concurrent websockets.")
+        parser.add_argument("--messages", type=int, default=3, help="Messages per websocket.")
+        parser.add_argument("--first-token-latency", type=float, default=0.3)
+        parser.add_argument("--tokens-per-second", type=float, default=50.0)
+        parser.add_argument("--answer-tokens", type=int, default=60)
+        parser.add_argument("--embedding-latency", type=float, default=0.05)
+        parser.add_argument(
+            "--upstream-limit",
+            type=int,
+            help="Fake server answers 429 above this many concurrent streams.",
+        )
+        parser.add_argument("--timeout", type=float, default=60.0, help="Per-frame receive timeout.")
+        parser.add_argument("--output", help="Write results as JSON to this path.")
+        parser.add_argument("--compare", help="Earlier results JSON to print deltas against.")
+        parser.add_argument("--keep-data", action="store_true", help="Keep the chat sessions created.")
+        parser.add_argument(
+            "--llm-concurrency",
+            type=int,
+            default=settings.LLM_MAX_CONCURRENCY,
+            help="Process-level LLM admission slots.",
+        )
+        parser.add_argument("--llm-queue", type=int, default=settings.LLM_MAX_QUEUE, help="Admission queue size.")
+        parser.add_argument(
+            "--connect-only",
+            action="store_true",
+            help="Measure websocket connect rate (a reconnect storm) instead of chat.",
+        )
+        parser.add_argument("--reconnects", type=int, default=5, help="Connects per user with --connect-only.")
+        parser.add_argument(
+            "--no-user-cache",
+            action="store_true",
+            help="Look the user up in the database on every connect (JWT_USER_CACHE_TTL=0).",
+        )
+        parser.add_argument(
+            "--answer-fast-path",
+            action="store_true",
+            help="Answer questions with no relevant context without the model (CHAT_NO_ANSWER_FAST_PATH); "
+            "off by default here. The bench corpus is usually empty, so this makes every question off-topic.",
+        )
+        parser.add_argument(
+            "--no-shared-client",
+            action="store_true",
+            help="Create an OpenAI client per request (OPENAI_SHARED_CLIENT=False) for comparison.",
+        )
+
+    def handle(self, *args, **options):
+        users = self._bench_users(options["users"])
+        tokens = [str(AccessToken.for_user(user)) for user in users]
+
+        server = FakeOpenAIServer(
+            first_token_latency=options["first_token_latency"],
+            tokens_per_second=options["tokens_per_second"],
+            answer_tokens=options["answer_tokens"],
+            embedding_latency=options["embedding_latency"],
+            max_concurrent_chats=options["upstream_limit"],
+        )
+        overrides = {
+            "OPENAI_API_KEY": settings.OPENAI_API_KEY or "bench",
+            "OPENAI_BASE_URL": server.base_url,
+            "CHANNEL_LAYERS": {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+            "OPENAI_SHARED_CLIENT": not options["no_shared_client"],
+            "RATE_LIMIT_ENABLED": False,
+            "LLM_CLUSTER_MAX_CONCURRENCY": 0,
+            "LLM_MAX_CONCURRENCY": options["llm_concurrency"],
+            "LLM_MAX_QUEUE": options["llm_queue"],
+            "CHAT_NO_ANSWER_FAST_PATH": options["answer_fast_path"],
+        }
+        if options["no_user_cache"]:
+            overrides["JWT_USER_CACHE_TTL"] = 0
+        with server, override_settings(**overrides):
+            from core.asgi import application
+
+            if options["connect_only"]:
+                results = asyncio.run(self._run_connects(application, tokens, options))
+            else:
+                # Open the vector store and load the OpenAI client's lazily
+                # imported resources up front so answers are measured warm.
+                get_runtime().acquire()
+                importlib.import_module("openai.resources")
+                results = asyncio.run(self._run(application, tokens, options))
+            results["upstream"] = dict(server.app.counters)
+
+        if not options["keep_data"]:
+            from chat.models import ChatSession
+
+            ChatSession.objects.filter(user__in=users).delete()
+
+        report = {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "options": {
+                key: options[key]
+                for key in (
+                    "users",
+                    "messages",
+                    "first_token_latency",
+                    "tokens_per_second",
+                    "answer_tokens",
+                    "embedding_latency",
+                    "no_shared_client",
+                    "llm_concurrency",
+                    "llm_queue",
+                    "upstream_limit",
+                    "connect_only",
+                    "reconnects",
+                    "no_user_cache",
+                    "answer_fast_path",
+                )
+            },
+            "results": results,
+        }
+        self._print(report)
+        if options["compare"]:
+            with open(options["compare"]) as handle:
+                self._print_comparison(json.load(handle), report)
+        if options["output"]:
+            with open(options["output"], "w") as handle:
+                json.dump(report, handle, indent=2)
+
+    def _bench_users(self, count):
+        user_model = get_user_model()
+        users = []
+        for index in range(count):
+            user, created = user_model.objects.get_or_create(username=f"{BENCH_USER_PREFIX}{index}")
+            if created:
+                user.set_unusable_password()
+                user.save(update_fields=["password"])
+            users.append(user)
+        return users
+
+    async def _run_connects(self, application, tokens, options):
+        samples = []
+        errors = {}
+
+        async def client(token):
+            for _ in range(options["reconnects"]):
+                communicator = WebsocketCommunicator(application, f"/ws/chat/?token={token}")
+                started = time.perf_counter()
+                connected, _ = await communicator.connect(timeout=options["timeout"])
+                if not connected:
+                    errors["connect_refused"] = errors.get("connect_refused", 0) + 1
+                    continue
+                await communicator.receive_json_from(timeout=options["timeout"])
+                samples.append(time.perf_counter() - started)
+                await communicator.disconnect()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(token) for token in tokens))
+        wall = time.perf_counter() - started
+        return {
+            "wall_seconds": wall,
+            "connects": len(samples),
+            "connects_per_second": len(samples) / wall if wall else 0.0,
+            "errors": errors,
+            "connect": summarize(samples),
+        }
+
+    async def _run(self, application, tokens, options):
+        samples = {"connect": [], "ttft": [], "total": [], "frames": [], "bytes": []}
+        errors = {}
+
+        async def client(index, token):
+            communicator = WebsocketCommunicator(application, f"/ws/chat/?token={token}")
+            started = time.perf_counter()
+            connected, _ = await communicator.connect(timeout=options["timeout"])
+            if not connected:
+                errors["connect_refused"] = errors.get("connect_refused", 0) + 1
+                return
+            await communicator.receive_json_from(timeout=options["timeout"])
+            samples["connect"].append(time.perf_counter() - started)
+
+            session_id = None
+            try:
+                for message_index in range(options["messages"]):
+                    question = QUESTIONS[(index + message_index) % len(QUESTIONS)]
+                    await communicator.send_json_to(
+                        {"message": f"{question} ({index}.{message_index})", "session_id": session_id}
+                    )
+                    sent = time.perf_counter()
+                    first_token = None
+                    frames = 0
+                    delta_bytes = 0
+                    while True:
+                        raw = await communicator.receive_from(timeout=options["timeout"])
+                        frame = json.loads(raw)
+                        frames += 1
+                        if frame["type"] == "delta":
+                            delta_bytes += len(raw.encode("utf-8"))
+                        if frame["type"] == "session":
+                            session_id = frame["session_id"]
+                        elif frame["type"] == "delta" and first_token is None:
+                            first_token = time.perf_counter() - sent
+                        elif frame["type"] == "done":
+                            samples["ttft"].append(first_token)
+                            samples["total"].append(time.perf_counter() - sent)
+                            samples["frames"].append(frames)
+                            samples["bytes"].append(delta_bytes)
+                            break
+                        elif frame["type"] == "error":
+                            errors[frame["error"]] = errors.get(frame["error"], 0) + 1
+                            break
+            except asyncio.TimeoutError:
+                errors["timeout"] = errors.get("timeout", 0) + 1
+            finally:
+                await communicator.disconnect()
+
+        # Summary updates are queued instead of sent to a broker and run once
+        # the load is over, as a worker would, so they stay off the measured
+        # request path.
+        summaries = []
+        started = time.perf_counter()
+        try:
+            with mock.patch.object(update_session_summary, "delay", summaries.append):
+                await asyncio.gather(*(client(index, token) for index, token in enumerate(tokens)))
+            wall = time.perf_counter() - started
+            for session_id in summaries:
+                await database_sync_to_async(summarize_session)(session_id)
+        finally:
+            await aclose_clients()
+
+        completed = len(samples["total"])
+        return {
+            "wall_seconds": wall,
+            "messages_completed": completed,
+            "messages_per_second": completed / wall if wall else 0.0,
+            "errors": errors,
+            "connect": summarize(samples["connect"]),
+            "time_to_first_token": summarize([value for value in samples["ttft"] if value is not None]),
+            "full_answer": summarize(samples["total"]),
+            "frames_per_answer": statistics.mean(samples["frames"]) if samples["frames"] else None,
+            "delta_bytes_per_answer": statistics.mean(samples["bytes"]) if samples["bytes"] else None,
+            "summaries_queued": len(summaries),
+        }
+
+    def _print(self, report):
+        results = report["results"]
+        options = report["options"]
+        if "connects_per_second" in results:
+            self.stdout.write(
+                f"revision {report['revision']}  users={options['users']} reconnects={options['reconnects']} "
+                f"user_cache={not options['no_user_cache']}"
+            )
+            self.stdout.write(
+                f"{results['connects']} connects in {results['wall_seconds']:.2f}s "
+                f"({results['connects_per_second']:.1f}/s), errors={results['errors'] or 'none'}"
+            )
+            stats = results["connect"]
+            if stats["count"]:
+                self.stdout.write(
+                    f"{'connect':<12} p50 {stats['p50_ms']:8.1f}ms  p90 {stats['p90_ms']:8.1f}ms  "
+                    f"p99 {stats['p99_ms']:8.1f}ms  max {stats['max_ms']:8.1f}ms"
+                )
+            return
+        self.stdout.write(
+            f"revision {report['revision']}  users={options['users']} messages={options['messages']} "
+            f"shared_client={not options.get('no_shared_client', False)}"
+        )
+        self.stdout.write(
+            f"completed {results['messages_completed']} in {results['wall_seconds']:.2f}s "
+            f"({results['messages_per_second']:.1f} msg/s), errors={results['errors'] or 'none'}"
+        )
+        if results["frames_per_answer"] is not None:
+            self.stdout.write(
+                f"frames/answer {results['frames_per_answer']:.1f}, "
+                f"delta bytes/answer {results['delta_bytes_per_answer']:.0f}"
+            )
+        prompt_chars = prompt_chars_per_request(results)
+        if prompt_chars is not None:
+            self.stdout.write(
+                f"prompt chars/request {prompt_chars:.0f}, "
+                f"summaries queued {results.get('summaries_queued', 0)}"
+            )
+        for label, key in (
+            ("connect", "connect"),
+            ("first token", "time_to_first_token"),
+            ("full answer", "full_answer"),
+        ):
+            stats = results[key]
+            if not stats["count"]:
+                continue
+            self.stdout.write(
+                f"{label:<12} p50 {stats['p50_ms']:8.1f}ms  p90 {stats['p90_ms']:8.1f}ms  "
+                f"p99 {stats['p99_ms']:8.1f}ms  max {stats['max_ms']:8.1f}ms"
+            )
+
+    def _print_comparison(self, baseline, report):
+        self.stdout.write(f"vs {baseline.get('revision')}:")
+        before = baseline["results"]
+        after = report["results"]
+        if "connects_per_second" in after:
+            if "connects_per_second" in before:
+                self.stdout.write(
+                    f"connects/s   {before['connects_per_second']:8.1f} -> {after['connects_per_second']:8.1f}"
+                )
+            for stat in ("p50_ms", "p99_ms"):
+                if before["connect"].get("count") and after["connect"].get("count"):
+                    self.stdout.write(
+                        f"{'connect':<12} {stat:<6} {before['connect'][stat]:8.1f} -> {after['connect'][stat]:8.1f}"
+                    )
+            return
+        self.stdout.write(
+            f"msg/s        {before['messages_per_second']:8.1f} -> {after['messages_per_second']:8.1f}"
+        )
+        if prompt_chars_per_request(before) is not None and prompt_chars_per_request(after) is not None:
+            self.stdout.write(
+                f"prompt chars {prompt_chars_per_request(before):8.0f} -> {prompt_chars_per_request(after):8.0f}"
+            )
+        for label, key in (("first token", "time_to_first_token"), ("full answer", "full_answer")):
+            if not before[key].get("count") or not after[key].get("count"):
+                continue
+            for stat in ("p50_ms", "p99_ms"):
+                self.stdout.write(
+                    f"{label:<12} {stat:<6} {before[key][stat]:8.1f} -> {after[key][stat]:8.1f}"
+                )
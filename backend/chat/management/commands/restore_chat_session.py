@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.models import ArchivedSession
+from chat.retention import restore_session
+
+
+class Command(BaseCommand):
+    help = "Move archived chat sessions back into the chat tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("session_ids", nargs="+", type=int)
+
+    def handle(self, *args, **options):
+        for session_id in options["session_ids"]:
+            try:
+                session = restore_session(session_id)
+            except ArchivedSession.DoesNotExist:
+                raise CommandError(f"Session {session_id} is not archived.")
+            self.stdout.write(
+                self.style.SUCCESS(f"Restored session {session.id} with {session.messages.count()} messages.")
+            )
@@ -0,0 +1,57 @@
+from core import metrics
+
+STAGE_SECONDS = metrics.histogram(
+    "chat_stage_seconds",
+    "Time spent in each stage of handling a chat message.",
+    ["stage"],
+)
+TIME_TO_FIRST_TOKEN = metrics.histogram(
+    "chat_time_to_first_token_seconds",
+    "Time from receiving a chat message to sending its first delta.",
+)
+ACTIVE_CONNECTIONS = metrics.gauge(
+    "chat_active_connections",
+    "Open chat websockets in this process.",
+)
+RATE_LIMITED = metrics.counter(
+    "chat_rate_limited_total",
+    "Chat messages rejected by the rate limiter.",
+)
+MESSAGES = metrics.counter(
+    "chat_messages_total",
+    "Chat messages handled, by outcome.",
+    ["outcome"],
+)
+ANSWER_FRAMES = metrics.histogram(
+    "chat_answer_frames",
+    "Delta frames sent per answer.",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000),
+)
+ANSWER_BYTES = metrics.histogram(
+    "chat_answer_bytes",
+    "Bytes of delta frames sent per answer.",
+    buckets=(256, 1024, 4096, 16384, 65536, 262144),
+)
+LLM_ACTIVE_STREAMS = metrics.gauge(
+    "chat_llm_active_streams",
+    "Upstream LLM streams holding an admission slot in this process.",
+)
+LLM_QUEUE_DEPTH = metrics.gauge(
+    "chat_llm_queue_depth",
+    "Messages waiting for an LLM admission slot in this process.",
+)
+ADMISSION_WAIT_SECONDS = metrics.histogram(
+    "chat_llm_admission_wait_seconds",
+    "Time from asking for an LLM slot to getting one.",
+)
+ADMISSION_REJECTED = metrics.counter(
+    "chat_llm_admission_rejected_total",
+    "Messages turned away by LLM admission control, by reason.",
+    ["reason"],
+)
+CONTEXT_TOKENS = metrics.histogram(
+    "chat_context_tokens",
+    "Tokens of retrieved context per message, before and after packing.",
+    ["stage"],
+    buckets=(100, 250, 500, 1000, 1500, 2000, 3000, 5000, 10000),
+)
@@ -1,30 +1,80 @@
+import logging
 from urllib.parse import parse_qs
 
+import redis
 from channels.db import database_sync_to_async
 from channels.middleware import BaseMiddleware
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from jwt import decode as jwt_decode
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_PREFIX = "jwt-user:"
+USER_VERSION_PREFIX = "jwt-user-version:"
+
+
+def invalidate_cached_user(user_id):
+    """Drop the cached user by moving the id on to a new version."""
+    key = f"{USER_VERSION_PREFIX}{user_id}"
+    try:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+    except redis.RedisError:
+        logger.warning(
+            "Could not invalidate cached user %s; it may be served for up to %ss",
+            user_id,
+            settings.JWT_USER_CACHE_TTL,
+            exc_info=True,
+        )
 
 
 @database_sync_to_async
 def get_user_for_id(user_id):
+    """Load the user for a token, going through a short-TTL cache.
+
+    Cache entries are keyed by user id and that id's version, which the
+    user post_save/post_delete signals bump. The cache lives in Redis and is
+    shared by every worker, so a changed or deleted user is not served from
+    it by any process. When Redis is unreachable the user is read from the
+    database. JWT_USER_CACHE_TTL=0 disables the cache.
+    """
     user_model = get_user_model()
-    try:
-        from rest_framework_simplejwt.settings import api_settings
+    ttl = settings.JWT_USER_CACHE_TTL
+    key = None
+    if ttl > 0:
+        try:
+            version = cache.get(f"{USER_VERSION_PREFIX}{user_id}", 0)
+            key = f"{USER_CACHE_PREFIX}{user_id}:{version}"
+            user = cache.get(key)
+        except redis.RedisError:
+            logger.warning("User cache unavailable; reading user %s from the database", user_id)
+            user = None
+        if user is not None:
+            return user
 
-        return user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+    try:
+        user = user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
     except user_model.DoesNotExist:
-        from django.contrib.auth.models import AnonymousUser
-
         return AnonymousUser()
 
+    if key is not None:
+        try:
+            cache.set(key, user, ttl)
+        except redis.RedisError:
+            pass
+    return user
+
 
 class JwtAuthMiddleware(BaseMiddleware):
     async def __call__(self, scope, receive, send):
         scope = dict(scope)
-        from django.contrib.auth.models import AnonymousUser
-
         scope["user"] = AnonymousUser()
         token = self._get_token(scope)
         if token:
@@ -47,38 +97,20 @@ class JwtAuthMiddleware(BaseMiddleware):
         return None
 
     async def _get_user_from_token(self, token):
+        # AccessToken verifies signature, expiry and token type in one decode.
         try:
-            from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-            from rest_framework_simplejwt.tokens import UntypedToken
-
-            UntypedToken(token)
-        except (InvalidToken, TokenError):
-            from django.contrib.auth.models import AnonymousUser
-
+            validated = AccessToken(token)
+        except TokenError:
             return AnonymousUser()
 
-        try:
-            from rest_framework_simplejwt.settings import api_settings
-
-            payload = jwt_decode(
-                token,
-                settings.SECRET_KEY,
-                algorithms=[api_settings.ALGORITHM],
-            )
-        except Exception:
-            from django.contrib.auth.models import AnonymousUser
-
-            return AnonymousUser()
-
-        from rest_framework_simplejwt.settings import api_settings
-
-        user_id = payload.get(api_settings.USER_ID_CLAIM)
+        user_id = validated.get(api_settings.USER_ID_CLAIM)
         if not user_id:
-            from django.contrib.auth.models import AnonymousUser
-
             return AnonymousUser()
 
-        return await get_user_for_id(user_id)
+        user = await get_user_for_id(user_id)
+        if not user.is_active:
+            return AnonymousUser()
+        return user
 
 
 def JwtAuthMiddlewareStack(inner):
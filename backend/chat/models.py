@@ -5,6 +5,20 @@ from django.db import models
 class ChatSession(models.Model):
 	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 	created_at = models.DateTimeField(auto_now_add=True)
+	# Denormalized so the session list needs no per-session query; kept
+	# current by Message.save.
+	last_message = models.ForeignKey(
+		"Message",
+		null=True,
+		blank=True,
+		on_delete=models.SET_NULL,
+		related_name="+",
+	)
+	# Rolling summary of the messages up to summarized_until_id, kept by
+	# chat.tasks.update_session_summary for history that no longer fits
+	# the prompt.
+	summary = models.TextField(blank=True, default="")
+	summarized_until_id = models.PositiveBigIntegerField(default=0)
 
 	def __str__(self):
 		return f"Session {self.id}"
@@ -25,7 +39,36 @@ class Message(models.Model):
 	timestamp = models.DateTimeField(auto_now_add=True)
 
 	class Meta:
-		ordering = ["timestamp"]
+		ordering = ["timestamp", "id"]
+		indexes = [
+			# Serves the keyset-paginated history and the latest-message lookups.
+			models.Index(fields=["session", "timestamp", "id"], name="chat_msg_session_ts_id_idx"),
+		]
 
 	def __str__(self):
 		return f"{self.role}: {self.content[:40]}"
+
+	def save(self, *args, **kwargs):
+		created = self._state.adding
+		super().save(*args, **kwargs)
+		if created:
+			ChatSession.objects.filter(id=self.session_id).update(last_message=self)
+
+
+class ArchivedSession(models.Model):
+	"""A chat session moved out of the hot tables by chat.retention.
+
+	``payload`` is the session and its messages as zlib-compressed JSON. The
+	original ids are kept so a restored session comes back unchanged.
+	"""
+
+	session_id = models.PositiveBigIntegerField(unique=True)
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+	created_at = models.DateTimeField()
+	last_activity_at = models.DateTimeField()
+	message_count = models.PositiveIntegerField(default=0)
+	payload = models.BinaryField()
+	archived_at = models.DateTimeField(auto_now_add=True)
+
+	def __str__(self):
+		return f"Archived session {self.session_id}"
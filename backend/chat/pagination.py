@@ -0,0 +1,29 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ChatSessionCursorPagination(CursorPagination):
+    """Keyset pagination, newest first; id breaks created_at ties."""
+
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class MessageCursorPagination(CursorPagination):
+    """Keyset pagination over one session's messages, newest page first.
+
+    ``next`` moves to older messages and ``previous`` to newer ones. Rows
+    within a page are returned oldest first so they can be rendered as-is.
+    """
+
+    ordering = ("-timestamp", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = super().paginate_queryset(queryset, request, view)
+        if page is None:
+            return None
+        return page[::-1]
@@ -0,0 +1,156 @@
+"""Move inactive chat sessions out of the hot tables and back.
+
+Sessions with no activity for CHAT_RETENTION_DAYS are written to
+ArchivedSession as one compressed JSON blob each and deleted together with
+their messages, so chat_message and its indexes only hold live
+conversations. restore_session puts an archived session back with its
+original ids and timestamps.
+"""
+
+import json
+import logging
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from chat.models import ArchivedSession, ChatSession, Message
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_VERSION = 1
+
+
+def stale_sessions(cutoff):
+    """Sessions with no message (or, when empty, no creation) since cutoff."""
+    return ChatSession.objects.filter(
+        Q(last_message__timestamp__lt=cutoff) | Q(last_message__isnull=True, created_at__lt=cutoff)
+    )
+
+
+def _encode(session, messages):
+    payload = {
+        "version": PAYLOAD_VERSION,
+        "session": {
+            "id": session.id,
+            "user_id": session.user_id,
+            "created_at": session.created_at.isoformat(),
+            "summary": session.summary,
+            "summarized_until_id": session.summarized_until_id,
+        },
+        "messages": [
+            {"id": m.id, "role": m.role, "content": m.content, "timestamp": m.timestamp.isoformat()}
+            for m in messages
+        ],
+    }
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def decode_payload(archive):
+    return json.loads(zlib.decompress(bytes(archive.payload)))
+
+
+@transaction.atomic
+def archive_session(session, cutoff=None):
+    """Archive and delete one session; returns the ArchivedSession.
+
+    The session row is locked first, so a message written meanwhile either
+    lands before the copy is taken or waits for the delete and fails. With
+    a ``cutoff``, a session that saw activity since then is left alone and
+    None is returned.
+    """
+    session = ChatSession.objects.select_for_update().filter(id=session.id).first()
+    if session is None:
+        return None
+    messages = list(session.messages.order_by("timestamp", "id"))
+    last_activity_at = messages[-1].timestamp if messages else session.created_at
+    if cutoff is not None and last_activity_at >= cutoff:
+        return None
+    archive = ArchivedSession.objects.create(
+        session_id=session.id,
+        user_id=session.user_id,
+        created_at=session.created_at,
+        last_activity_at=last_activity_at,
+        message_count=len(messages),
+        payload=_encode(session, messages),
+    )
+    session.delete()
+    return archive
+
+
+def archive_stale_sessions(days=None, batch_size=None, dry_run=False):
+    """Archive every session idle for ``days``; returns what was moved.
+
+    Each session is archived in its own transaction, so an interrupted run
+    leaves nothing half-moved and the next run picks up where it stopped.
+    """
+    days = settings.CHAT_RETENTION_DAYS if days is None else days
+    batch_size = batch_size or settings.CHAT_RETENTION_BATCH_SIZE
+    stats = {"sessions": 0, "messages": 0, "bytes": 0}
+    if days <= 0:
+        return stats
+
+    cutoff = timezone.now() - timedelta(days=days)
+    candidates = stale_sessions(cutoff).order_by("id")
+    if dry_run:
+        stats["sessions"] = candidates.count()
+        stats["messages"] = Message.objects.filter(session__in=candidates).count()
+        return stats
+
+    last_id = 0
+    while True:
+        batch = list(candidates.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        for session in batch:
+            archive = archive_session(session, cutoff=cutoff)
+            if archive is None:
+                continue
+            stats["sessions"] += 1
+            stats["messages"] += archive.message_count
+            stats["bytes"] += len(archive.payload)
+
+    if stats["sessions"]:
+        logger.info(
+            "Archived %s chat sessions (%s messages, %s compressed bytes)",
+            stats["sessions"],
+            stats["messages"],
+            stats["bytes"],
+        )
+    return stats
+
+
+@transaction.atomic
+def restore_session(session_id):
+    """Move an archived session back into the chat tables and return it."""
+    archive = ArchivedSession.objects.select_for_update().get(session_id=session_id)
+    payload = decode_payload(archive)
+
+    session = ChatSession.objects.create(
+        id=archive.session_id,
+        user_id=archive.user_id,
+        summary=payload["session"].get("summary", ""),
+        summarized_until_id=payload["session"].get("summarized_until_id", 0),
+    )
+    messages = Message.objects.bulk_create(
+        Message(id=item["id"], session=session, role=item["role"], content=item["content"])
+        for item in payload["messages"]
+    )
+    # auto_now_add stamped everything with the current time; put the
+    # original timestamps back.
+    for message, item in zip(messages, payload["messages"]):
+        message.timestamp = parse_datetime(item["timestamp"])
+    Message.objects.bulk_update(messages, ["timestamp"])
+    ChatSession.objects.filter(id=session.id).update(
+        created_at=parse_datetime(payload["session"]["created_at"]),
+        last_message=messages[-1] if messages else None,
+    )
+
+    archive.delete()
+    session.refresh_from_db()
+    return session
@@ -10,22 +10,29 @@ class MessageSerializer(serializers.ModelSerializer):
 
 
 class ChatSessionListSerializer(serializers.ModelSerializer):
-    last_message = serializers.SerializerMethodField()
+    last_message = MessageSerializer(read_only=True)
 
     class Meta:
         model = ChatSession
         fields = ["id", "created_at", "last_message"]
 
-    def get_last_message(self, obj):
-        message = obj.messages.order_by("-timestamp").first()
-        if not message:
-            return None
-        return MessageSerializer(message).data
-
 
 class ChatSessionDetailSerializer(serializers.ModelSerializer):
-    messages = MessageSerializer(many=True, read_only=True)
+    """A session with only its most recent page of messages.
+
+    The view passes the page and the link to older messages in the context
+    as ``message_page`` and ``messages_next``.
+    """
+
+    messages = serializers.SerializerMethodField()
+    messages_next = serializers.SerializerMethodField()
 
     class Meta:
         model = ChatSession
-        fields = ["id", "created_at", "messages"]
+        fields = ["id", "created_at", "messages", "messages_next"]
+
+    def get_messages(self, obj):
+        return MessageSerializer(self.context.get("message_page", []), many=True).data
+
+    def get_messages_next(self, obj):
+        return self.context.get("messages_next")
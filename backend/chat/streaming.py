@@ -0,0 +1,69 @@
+import asyncio
+import json
+import time
+
+
+class DeltaCoalescer:
+    """Batch answer deltas into fewer websocket frames.
+
+    The first delta is sent immediately so time to first token is unchanged.
+    After that, text is buffered until ``interval`` seconds have passed since
+    the last frame or ``max_bytes`` of text are waiting, whichever comes
+    first. ``close`` sends whatever is left and must be called before the
+    done or error frame. An interval of 0 sends every delta as its own frame.
+    """
+
+    def __init__(self, send, interval=0.04, max_bytes=1024):
+        self._send = send
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.frames = 0
+        self.bytes = 0
+        self._parts = []
+        self._pending_bytes = 0
+        self._flushed_at = None
+        self._timer = None
+        self._lock = asyncio.Lock()
+
+    async def add(self, text):
+        if not text:
+            return
+        self._parts.append(text)
+        self._pending_bytes += len(text.encode("utf-8"))
+        if (
+            self._flushed_at is None
+            or self.interval <= 0
+            or (self.max_bytes and self._pending_bytes >= self.max_bytes)
+            or time.monotonic() - self._flushed_at >= self.interval
+        ):
+            await self.flush()
+        elif self._timer is None:
+            # Deltas can stall mid-answer; don't hold buffered text until the
+            # next one arrives.
+            delay = self.interval - (time.monotonic() - self._flushed_at)
+            self._timer = asyncio.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay):
+        await asyncio.sleep(delay)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # The timer and the stream both flush; the lock keeps frames in order.
+        async with self._lock:
+            if not self._parts:
+                return
+            content = "".join(self._parts)
+            self._parts = []
+            self._pending_bytes = 0
+            self._flushed_at = time.monotonic()
+            frame = json.dumps({"type": "delta", "content": content})
+            self.frames += 1
+            self.bytes += len(frame.encode("utf-8"))
+            await self._send(text_data=frame)
+
+    async def close(self):
+        await self.flush()
@@ -0,0 +1,14 @@
+from celery import shared_task
+
+from chat.history import summarize_session
+from chat.retention import archive_stale_sessions
+
+
+@shared_task
+def archive_chat_sessions():
+    return archive_stale_sessions()
+
+
+@shared_task
+def update_session_summary(session_id):
+    return summarize_session(session_id)
@@ -1,3 +1,612 @@
-from django.test import TestCase
+import asyncio
+import json
+import uuid
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+import redis
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from chat.admission import AdmissionController, AdmissionRejected
+from chat.consumers import ChatConsumer
+from chat.history import prompt_history, render_message, select_history, summarize_session
+from chat.middleware import JwtAuthMiddleware
+from chat.models import ArchivedSession, ChatSession, Message
+from chat.retention import archive_session, archive_stale_sessions, restore_session
+from chat.streaming import DeltaCoalescer
+from core.ratelimit import KEY_PREFIX, RateLimiter, client_ip, parse_rate, request_ip, scope_ip
+from rag.prompts import NO_ANSWER_REPLY
+from rag.retrieval import RetrievedChunk
+from rag.tokens import count_tokens
+
+TEST_SETTINGS = {
+    "OPENAI_API_KEY": "test",
+    "CHAT_ANSWER_CACHE_ENABLED": False,
+    "RATE_LIMIT_ENABLED": False,
+    "LLM_CLUSTER_MAX_CONCURRENCY": 0,
+    "CHANNEL_LAYERS": {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+}
+
+
+def _chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class FakeOpenAI:
+    """Stands in for core.openai_client.async_openai, recording the request and the rows that
+    were already persisted when it was made."""
+
+    def __init__(self, deltas=("Hello", " there"), fail=False):
+        self.deltas = deltas
+        self.fail = fail
+        self.requests = []
+
+    @asynccontextmanager
+    async def __call__(self):
+        yield SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=self.create)))
+
+    async def create(self, messages, **kwargs):
+        persisted = await database_sync_to_async(
+            lambda: list(Message.objects.order_by("timestamp", "id").values_list("role", "content"))
+        )()
+        self.requests.append({"messages": messages, "persisted": persisted})
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return self._stream()
+
+    async def _stream(self):
+        for delta in self.deltas:
+            yield _chunk(delta)
+
+
+@override_settings(**TEST_SETTINGS)
+class ChatPipelineTests(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="alice", password="pw")
+        self.retrieved = []
+        self.corpus = [RetrievedChunk("Passwords are reset from the profile page.", 0.8)]
+
+    async def _fake_retrieve(self, query, top_k=5, embedding=None):
+        # Yield so the database work gets to run while retrieval is pending.
+        await asyncio.sleep(0.05)
+        self.retrieved.append(query)
+        return self.corpus
+
+    def _exchange(self, llm, message, session_id=None):
+        async def run():
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat/")
+            communicator.scope["user"] = self.user
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.receive_json_from()
+            await communicator.send_json_to({"message": message, "session_id": session_id})
+            frames = []
+            while True:
+                frame = await communicator.receive_json_from(timeout=5)
+                frames.append(frame)
+                if frame["type"] in ("done", "error"):
+                    break
+            await communicator.disconnect()
+            return frames
+
+        with mock.patch("chat.consumers.async_openai", llm), mock.patch(
+            "chat.consumers.aretrieve_context", self._fake_retrieve
+        ):
+            return async_to_sync(run)()
+
+    def test_user_message_is_saved_before_the_model_is_called(self):
+        llm = FakeOpenAI()
+        frames = self._exchange(llm, "How do I reset my password?")
+
+        self.assertEqual([frame["type"] for frame in frames], ["session", "delta", "delta", "done"])
+        self.assertEqual(llm.requests[0]["persisted"], [("user", "How do I reset my password?")])
+        self.assertEqual(self.retrieved, ["How do I reset my password?"])
+        self.assertIn("Passwords are reset", llm.requests[0]["messages"][0]["content"])
+        session = ChatSession.objects.get(id=frames[0]["session_id"])
+        self.assertEqual(
+            list(session.messages.order_by("timestamp", "id").values_list("role", "content")),
+            [("user", "How do I reset my password?"), ("assistant", "Hello there")],
+        )
+
+    def test_history_excludes_the_message_being_answered(self):
+        first = self._exchange(FakeOpenAI(deltas=("First answer",)), "First question")
+        session_id = first[0]["session_id"]
+
+        llm = FakeOpenAI()
+        self._exchange(llm, "Second question", session_id=session_id)
+
+        system_message = llm.requests[0]["messages"][0]["content"]
+        history = system_message.split("Conversation history:\n", 1)[1]
+        self.assertEqual(history, "user: First question\nassistant: First answer")
+        self.assertEqual(
+            llm.requests[0]["persisted"],
+            [("user", "First question"), ("assistant", "First answer"), ("user", "Second question")],
+        )
+
+    def test_failed_stream_keeps_the_question_and_saves_no_answer(self):
+        frames = self._exchange(FakeOpenAI(fail=True), "Is anyone there?")
+
+        self.assertEqual(frames[-1], {"type": "error", "error": "stream_failed"})
+        self.assertEqual(
+            list(Message.objects.values_list("role", "content")),
+            [("user", "Is anyone there?")],
+        )
+
+    def test_unknown_session_starts_a_new_one(self):
+        other = get_user_model().objects.create_user(username="bob", password="pw")
+        foreign = ChatSession.objects.create(user=other)
+
+        frames = self._exchange(FakeOpenAI(), "Hi", session_id=foreign.id)
+
+        self.assertNotEqual(frames[0]["session_id"], foreign.id)
+        self.assertFalse(foreign.messages.exists())
+        self.assertEqual(ChatSession.objects.get(id=frames[0]["session_id"]).user, self.user)
+
+    def test_nothing_relevant_answers_without_the_model(self):
+        self.corpus = []
+        llm = FakeOpenAI()
+
+        frames = self._exchange(llm, "What is the weather on Mars?")
+
+        self.assertEqual([frame["type"] for frame in frames], ["session", "delta", "done"])
+        self.assertEqual(frames[1]["content"], NO_ANSWER_REPLY)
+        self.assertEqual(llm.requests, [])
+        self.assertEqual(
+            list(Message.objects.order_by("timestamp", "id").values_list("role", "content")),
+            [("user", "What is the weather on Mars?"), ("assistant", NO_ANSWER_REPLY)],
+        )
+
+    def test_follow_ups_without_context_still_reach_the_model(self):
+        first = self._exchange(FakeOpenAI(), "How do I reset my password?")
+        self.corpus = []
+        llm = FakeOpenAI()
+
+        self._exchange(llm, "And after that?", session_id=first[0]["session_id"])
+
+        self.assertEqual(len(llm.requests), 1)
+
+    @override_settings(CHAT_HISTORY_TOKEN_BUDGET=60)
+    def test_history_is_cut_to_the_budget_and_the_rest_is_summarized(self):
+        session = ChatSession.objects.create(user=self.user, summary="The user asked about passwords.")
+        for index in range(4):
+            Message.objects.create(session=session, role=Message.ROLE_USER, content=f"old {index} " + "x" * 80)
+        Message.objects.create(session=session, role=Message.ROLE_ASSISTANT, content="Latest reply")
+
+        llm = FakeOpenAI()
+        with mock.patch("chat.consumers.update_session_summary") as task:
+            self._exchange(llm, "Next question", session_id=session.id)
+
+        system_message = llm.requests[0]["messages"][0]["content"]
+        self.assertIn("Conversation summary:\nThe user asked about passwords.", system_message)
+        self.assertTrue(system_message.endswith("assistant: Latest reply"))
+        self.assertNotIn("old 0", system_message)
+        task.delay.assert_called_once_with(session.id)
+
+
+class DeltaCoalescerTests(SimpleTestCase):
+    def _run(self, deltas, **options):
+        sent = []
+
+        async def send(text_data):
+            sent.append(json.loads(text_data)["content"])
+
+        async def run():
+            coalescer = DeltaCoalescer(send, **options)
+            for delta in deltas:
+                await coalescer.add(delta)
+            await coalescer.close()
+            return coalescer
+
+        coalescer = async_to_sync(run)()
+        return sent, coalescer
+
+    def test_first_delta_is_sent_alone_and_the_rest_batched(self):
+        sent, coalescer = self._run(["a", "b", "c", "d"], interval=10, max_bytes=0)
+
+        self.assertEqual(sent, ["a", "bcd"])
+        self.assertEqual(coalescer.frames, 2)
+
+    def test_byte_threshold_flushes(self):
+        sent, _ = self._run(["a", "bb", "cc", "dd"], interval=10, max_bytes=4)
+
+        self.assertEqual(sent, ["a", "bbcc", "dd"])
+
+    def test_interval_flushes_while_the_stream_stalls(self):
+        sent = []
+
+        async def send(text_data):
+            sent.append(json.loads(text_data)["content"])
+
+        async def run():
+            coalescer = DeltaCoalescer(send, interval=0.02, max_bytes=0)
+            await coalescer.add("a")
+            await coalescer.add("b")
+            await asyncio.sleep(0.1)
+            stalled = list(sent)
+            await coalescer.add("c")
+            await coalescer.close()
+            return stalled
+
+        self.assertEqual(async_to_sync(run)(), ["a", "b"])
+        self.assertEqual(sent, ["a", "b", "c"])
+
+    def test_zero_interval_sends_every_delta(self):
+        sent, _ = self._run(["a", "b", "c"], interval=0)
+
+        self.assertEqual(sent, ["a", "b", "c"])
+
+
+@override_settings(LLM_MAX_CONCURRENCY=1, LLM_MAX_QUEUE=1, LLM_CLUSTER_MAX_CONCURRENCY=0, LLM_QUEUE_TIMEOUT=5)
+class AdmissionControllerTests(SimpleTestCase):
+    def test_queues_in_order_and_rejects_when_the_queue_is_full(self):
+        controller = AdmissionController()
+        events = []
+
+        async def request(name, hold):
+            async def notify(position):
+                events.append((name, "queued", position))
+
+            try:
+                async with controller.slot(notify=notify):
+                    events.append((name, "admitted"))
+                    await hold.wait()
+            except AdmissionRejected as exc:
+                events.append((name, "rejected", exc.retry_after))
+
+        async def run():
+            first_hold, second_hold, third_hold = asyncio.Event(), asyncio.Event(), asyncio.Event()
+            first = asyncio.create_task(request("first", first_hold))
+            await asyncio.sleep(0)
+            second = asyncio.create_task(request("second", second_hold))
+            await asyncio.sleep(0)
+            await request("third", third_hold)
+            first_hold.set()
+            second_hold.set()
+            await asyncio.gather(first, second)
+
+        async_to_sync(run)()
+
+        self.assertEqual(events[0], ("first", "admitted"))
+        self.assertEqual(events[1], ("second", "queued", 1))
+        self.assertEqual(events[2][:2], ("third", "rejected"))
+        self.assertGreaterEqual(events[2][2], 1)
+        self.assertEqual(events[3], ("second", "admitted"))
+
+    @override_settings(LLM_QUEUE_TIMEOUT=0.05)
+    def test_waiting_past_the_timeout_is_rejected_and_frees_the_queue(self):
+        controller = AdmissionController()
+
+        async def run():
+            hold = asyncio.Event()
+
+            async def holder():
+                async with controller.slot():
+                    await hold.wait()
+
+            task = asyncio.create_task(holder())
+            await asyncio.sleep(0)
+            with self.assertRaises(AdmissionRejected):
+                async with controller.slot():
+                    pass
+            hold.set()
+            await task
+            async with controller.slot():
+                pass
+            return controller._state().active, len(controller._state().waiters)
+
+        self.assertEqual(async_to_sync(run)(), (0, 0))
+
+
+class ClientIpTests(SimpleTestCase):
+    @override_settings(RATE_LIMIT_TRUSTED_PROXIES=0)
+    def test_forwarded_for_is_ignored_without_trusted_proxies(self):
+        self.assertEqual(client_ip("10.0.0.2", "203.0.113.7"), "10.0.0.2")
+
+    @override_settings(RATE_LIMIT_TRUSTED_PROXIES=1)
+    def test_the_hop_added_by_the_trusted_proxy_is_the_client(self):
+        # The client wrote the first entry itself; the router appended the second.
+        self.assertEqual(client_ip("10.0.0.2", "198.51.100.1, 203.0.113.7"), "203.0.113.7")
+
+    @override_settings(RATE_LIMIT_TRUSTED_PROXIES=1)
+    def test_http_and_websocket_requests_agree(self):
+        request = SimpleNamespace(META={"REMOTE_ADDR": "10.0.0.2", "HTTP_X_FORWARDED_FOR": "203.0.113.7"})
+        scope = {"client": ("10.0.0.2", 51000), "headers": [(b"x-forwarded-for", b"203.0.113.7")]}
+
+        self.assertEqual(request_ip(request), "203.0.113.7")
+        self.assertEqual(scope_ip(scope), "203.0.113.7")
+
+
+@override_settings(RATE_LIMIT_ENABLED=True)
+class RateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        self.limiter = RateLimiter(settings.REDIS_URL)
+        try:
+            self.limiter._sync_script().registered_client.ping()
+        except redis.RedisError:
+            self.skipTest("Redis is not reachable at REDIS_URL")
+        self.key = f"{KEY_PREFIX}test:{uuid.uuid4().hex}"
+        self.addCleanup(self.limiter._sync_script().registered_client.delete, self.key)
+
+    def test_an_empty_bucket_is_denied_with_the_time_until_a_token(self):
+        buckets = [(self.key, parse_rate("2/10s"))]
+
+        self.assertIsNone(self.limiter.check("test", buckets))
+        self.assertIsNone(self.limiter.check("test", buckets))
+        retry_after = self.limiter.check("test", buckets)
+
+        # One token comes back every 5 seconds.
+        self.assertIn(retry_after, (4, 5))
+
+    def test_a_denied_check_takes_no_tokens(self):
+        other = f"{self.key}:other"
+        self.addCleanup(self.limiter._sync_script().registered_client.delete, other)
+        empty = [(self.key, parse_rate("1/h"))]
+        self.assertIsNone(self.limiter.check("test", empty))
+
+        self.assertIsNotNone(async_to_sync(self.limiter.acheck)("test", empty + [(other, parse_rate("1/h"))]))
+        self.assertIsNone(self.limiter.check("test", [(other, parse_rate("1/h"))]))
+
+
+@override_settings(JWT_USER_CACHE_TTL=60)
+class JwtAuthMiddlewareTests(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="carol", password="pw")
+        self.middleware = JwtAuthMiddleware(None)
+
+    def _authenticate(self, token):
+        return async_to_sync(self.middleware._get_user_from_token)(str(token))
+
+    def test_cached_user_is_dropped_when_the_user_changes(self):
+        token = AccessToken.for_user(self.user)
+        self.assertEqual(self._authenticate(token), self.user)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertTrue(self._authenticate(token).is_anonymous)
+
+    def test_users_are_read_from_the_database_when_the_cache_is_down(self):
+        token = AccessToken.for_user(self.user)
+
+        with mock.patch("chat.middleware.cache.get", side_effect=redis.ConnectionError):
+            self.assertEqual(self._authenticate(token), self.user)
+
+    def test_refresh_and_tampered_tokens_are_rejected(self):
+        self.assertTrue(self._authenticate(RefreshToken.for_user(self.user)).is_anonymous)
+        self.assertTrue(self._authenticate(str(AccessToken.for_user(self.user)) + "x").is_anonymous)
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN="")
+class MetricsEndpointTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def _get(self, user=None, token=None):
+        if user is not None:
+            token = str(AccessToken.for_user(user))
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+        return self.client.get("/api/metrics/", **headers)
+
+    def test_without_a_token_only_staff_can_read_metrics(self):
+        user_model = get_user_model()
+        staff = user_model.objects.create_user(username="judy", password="pw", is_staff=True)
+        member = user_model.objects.create_user(username="ken", password="pw")
+
+        self.assertEqual(self._get().status_code, 401)
+        self.assertEqual(self._get(token="not-a-jwt").status_code, 401)
+        self.assertEqual(self._get(member).status_code, 403)
+        self.assertEqual(self._get(staff).status_code, 200)
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_the_scrape_token_is_required_when_set(self):
+        self.assertEqual(self._get(token="wrong").status_code, 401)
+        self.assertEqual(self._get(token="scrape-secret").status_code, 200)
+
+
+class ChatSessionListTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="dave", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _create_sessions(self, count):
+        for index in range(count):
+            session = ChatSession.objects.create(user=self.user)
+            Message.objects.create(session=session, role=Message.ROLE_USER, content=f"question {index}")
+            Message.objects.create(session=session, role=Message.ROLE_ASSISTANT, content=f"answer {index}")
+
+    def test_query_count_does_not_grow_with_sessions(self):
+        self._create_sessions(3)
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/chat/sessions/")
+        self.assertEqual(len(response.data["results"]), 3)
+
+        self._create_sessions(15)
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/chat/sessions/")
+        self.assertEqual(len(response.data["results"]), 18)
+        self.assertEqual(response.data["results"][0]["last_message"]["content"], "answer 14")
+
+    def test_pages_follow_the_cursor_without_gaps(self):
+        self._create_sessions(5)
+        ChatSession.objects.create(user=self.user)
+
+        seen = []
+        url = "/api/chat/sessions/?page_size=2"
+        while url:
+            response = self.client.get(url)
+            seen.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+
+        expected = list(ChatSession.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+        self.assertIsNone(self.client.get("/api/chat/sessions/").data["results"][0]["last_message"])
+
+
+class ChatMessageHistoryTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="erin", password="pw")
+        self.session = ChatSession.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _add_messages(self, count):
+        Message.objects.bulk_create(
+            Message(session=self.session, role=Message.ROLE_USER, content=f"message {index}")
+            for index in range(count)
+        )
+
+    def test_detail_returns_only_the_latest_page(self):
+        self._add_messages(5)
+        with self.assertNumQueries(2):
+            small = self.client.get(f"/api/chat/sessions/{self.session.id}/?page_size=3")
+
+        self._add_messages(200)
+        with self.assertNumQueries(2):
+            large = self.client.get(f"/api/chat/sessions/{self.session.id}/?page_size=3")
+
+        self.assertEqual([m["content"] for m in small.data["messages"]], ["message 2", "message 3", "message 4"])
+        self.assertEqual(len(large.data["messages"]), 3)
+        self.assertIn(f"/api/chat/sessions/{self.session.id}/messages/", large.data["messages_next"])
+
+    def test_cursor_walks_back_through_the_whole_history(self):
+        self._add_messages(7)
+        response = self.client.get(f"/api/chat/sessions/{self.session.id}/?page_size=3")
+        pages = [[m["content"] for m in response.data["messages"]]]
+        url = response.data["messages_next"]
+        while url:
+            response = self.client.get(url)
+            pages.insert(0, [m["content"] for m in response.data["results"]])
+            url = response.data["next"]
+
+        self.assertEqual(sum(pages, []), [f"message {index}" for index in range(7)])
+
+        older = self.client.get(f"/api/chat/sessions/{self.session.id}/messages/?page_size=3").data["next"]
+        newer = self.client.get(self.client.get(older).data["previous"])
+        self.assertEqual([m["content"] for m in newer.data["results"]], ["message 4", "message 5", "message 6"])
+
+    def test_other_users_sessions_are_not_found(self):
+        other = APIClient()
+        other.force_authenticate(get_user_model().objects.create_user(username="frank", password="pw"))
+
+        self.assertEqual(other.get(f"/api/chat/sessions/{self.session.id}/messages/").status_code, 404)
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="grace", password="pw")
+
+    def _session(self, age_days, messages=3):
+        session = ChatSession.objects.create(user=self.user)
+        for index in range(messages):
+            Message.objects.create(session=session, role=Message.ROLE_USER, content=f"message {index} " * 20)
+        then = timezone.now() - timedelta(days=age_days)
+        ChatSession.objects.filter(id=session.id).update(created_at=then)
+        session.messages.update(timestamp=then)
+        return session
+
+    def test_stale_sessions_are_archived_and_restored_unchanged(self):
+        stale = self._session(age_days=40)
+        empty = self._session(age_days=40, messages=0)
+        fresh = self._session(age_days=1)
+        before = list(stale.messages.order_by("timestamp", "id").values_list("id", "role", "content", "timestamp"))
+
+        stats = archive_stale_sessions(days=30)
+
+        self.assertEqual(stats["sessions"], 2)
+        self.assertEqual(stats["messages"], 3)
+        self.assertEqual(list(ChatSession.objects.values_list("id", flat=True)), [fresh.id])
+        self.assertFalse(Message.objects.filter(session_id=stale.id).exists())
+        archive = ArchivedSession.objects.get(session_id=stale.id)
+        self.assertLess(len(archive.payload), sum(len(row[2]) for row in before))
+
+        restored = restore_session(stale.id)
+
+        self.assertEqual(restored.id, stale.id)
+        self.assertEqual(
+            list(restored.messages.order_by("timestamp", "id").values_list("id", "role", "content", "timestamp")),
+            before,
+        )
+        self.assertEqual(restored.last_message_id, before[-1][0])
+        self.assertFalse(ArchivedSession.objects.filter(session_id=stale.id).exists())
+        self.assertTrue(ArchivedSession.objects.filter(session_id=empty.id).exists())
+
+    def test_a_session_that_became_active_is_not_archived(self):
+        session = self._session(age_days=40)
+        cutoff = timezone.now() - timedelta(days=30)
+        Message.objects.create(session=session, role=Message.ROLE_USER, content="still here")
+
+        self.assertIsNone(archive_session(session, cutoff=cutoff))
+        self.assertEqual(session.messages.count(), 4)
+        self.assertFalse(ArchivedSession.objects.exists())
+
+    def test_zero_days_keeps_everything(self):
+        self._session(age_days=400)
+
+        self.assertEqual(archive_stale_sessions(days=0)["sessions"], 0)
+        self.assertEqual(ChatSession.objects.count(), 1)
+
+
+class HistoryBudgetTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="heidi", password="pw")
+        self.session = ChatSession.objects.create(user=self.user)
+
+    def _tokens(self, message):
+        return count_tokens(render_message(message)) + 1
+
+    def test_newest_messages_that_fit_are_kept(self):
+        messages = [Message(role=Message.ROLE_USER, content=f"message {index} " * (index + 1)) for index in range(5)]
+        newest_first = messages[::-1]
+        budget = self._tokens(messages[4]) + self._tokens(messages[3])
+
+        kept, omitted = select_history(newest_first, budget)
+
+        self.assertEqual(kept, [messages[3], messages[4]])
+        self.assertEqual(omitted, 3)
+
+    def test_an_oversized_latest_message_is_truncated(self):
+        message = Message(role=Message.ROLE_ASSISTANT, content="word " * 500)
+
+        kept, omitted = select_history([message], 20)
+
+        self.assertEqual(omitted, 0)
+        self.assertLessEqual(self._tokens(kept[0]), 20)
+        self.assertEqual(message.content, "word " * 500)
+
+    @override_settings(CHAT_HISTORY_TOKEN_BUDGET=40, CHAT_SUMMARY_MAX_TOKENS=50)
+    def test_messages_outside_the_window_are_folded_into_the_summary(self):
+        for index in range(6):
+            Message.objects.create(session=self.session, role=Message.ROLE_USER, content=f"turn {index} " * 8)
+        requests = []
+
+        def create(**kwargs):
+            requests.append(kwargs)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Six turns so far."))])
+
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        window, omitted = prompt_history(self.session)
+        self.assertGreater(omitted, 0)
+
+        with mock.patch("chat.history.get_client", return_value=client):
+            result = summarize_session(self.session.id)
+
+        self.session.refresh_from_db()
+        self.assertEqual(result["folded"], 6 - len(window))
+        self.assertEqual(self.session.summary, "Six turns so far.")
+        messages = list(self.session.messages.order_by("timestamp", "id"))
+        folded = messages[: len(messages) - len(window)]
+        self.assertEqual(messages[len(folded):], window)
+        self.assertEqual(self.session.summarized_until_id, folded[-1].id)
+        self.assertIn("turn 0", requests[0]["messages"][1]["content"])
+        self.assertEqual(prompt_history(self.session), (window, 0))
@@ -1,16 +1,54 @@
 from rest_framework import permissions, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
 
 from chat.models import ChatSession
-from chat.serializers import ChatSessionDetailSerializer, ChatSessionListSerializer
+from chat.pagination import ChatSessionCursorPagination, MessageCursorPagination
+from chat.serializers import ChatSessionDetailSerializer, ChatSessionListSerializer, MessageSerializer
 
 
 class ChatSessionViewSet(viewsets.ReadOnlyModelViewSet):
 	permission_classes = [permissions.IsAuthenticated]
+	pagination_class = ChatSessionCursorPagination
 
 	def get_queryset(self):
-		return ChatSession.objects.filter(user=self.request.user).order_by("-created_at")
+		queryset = ChatSession.objects.filter(user=self.request.user)
+		if self.action == "list":
+			return queryset.select_related("last_message")
+		return queryset.order_by("-created_at")
 
 	def get_serializer_class(self):
 		if self.action == "retrieve":
 			return ChatSessionDetailSerializer
+		if self.action == "messages":
+			return MessageSerializer
 		return ChatSessionListSerializer
+
+	def _paginate_messages(self, session):
+		paginator = MessageCursorPagination()
+		page = paginator.paginate_queryset(session.messages.all(), self.request, view=self)
+		# Links always point at the messages endpoint, also when the first
+		# page is embedded in the session detail.
+		paginator.base_url = reverse("chat-sessions-messages", args=[session.pk], request=self.request)
+		return paginator, page
+
+	def retrieve(self, request, *args, **kwargs):
+		session = self.get_object()
+		paginator, page = self._paginate_messages(session)
+		serializer = self.get_serializer(
+			session,
+			context={
+				**self.get_serializer_context(),
+				"message_page": page,
+				"messages_next": paginator.get_next_link(),
+			},
+		)
+		return Response(serializer.data)
+
+	@action(detail=True, methods=["get"])
+	def messages(self, request, pk=None):
+		session = self.get_object()
+		paginator, page = self._paginate_messages(session)
+		serializer = self.get_serializer(page, many=True)
+		return paginator.get_paginated_response(serializer.data)
@@ -1,10 +1,11 @@
 from django.urls import include, path
 
-from core.views import ping
+from core.views import metrics, ping
 
 urlpatterns = []
 urlpatterns += [
 	path('ping/', ping, name='ping'),
+	path('metrics/', metrics, name='metrics'),
 	path('documents/', include('documents.urls')),
 	path('chat/', include('chat.urls')),
 ]
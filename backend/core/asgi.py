@@ -4,17 +4,34 @@ import os
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
 
+# Set up Django before importing anything that touches models.
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+
 from chat.middleware import JwtAuthMiddlewareStack
+from core.openai_client import aclose_clients
 from core.routing import websocket_urlpatterns
 
-django_asgi_app = get_asgi_application()
+
+async def lifespan(scope, receive, send):
+	"""Close the pooled async OpenAI client when the server shuts down."""
+	while True:
+		message = await receive()
+		if message["type"] == "lifespan.startup":
+			await send({"type": "lifespan.startup.complete"})
+		elif message["type"] == "lifespan.shutdown":
+			await aclose_clients()
+			await send({"type": "lifespan.shutdown.complete"})
+			return
+
 
 application = ProtocolTypeRouter(
 	{
 		"http": django_asgi_app,
 		"websocket": JwtAuthMiddlewareStack(URLRouter(websocket_urlpatterns)),
+		"lifespan": lifespan,
 	}
 )
@@ -0,0 +1,252 @@
+"""Local stand-in for the OpenAI chat and embedding endpoints.
+
+Used by the benchmark commands so load tests exercise the real client code
+without network variance or API spend. Point OPENAI_BASE_URL at
+``FakeOpenAIServer.base_url`` (or run ``python -m core.fake_openai``).
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import socket
+import threading
+import time
+
+import numpy as np
+import uvicorn
+
+DEFAULT_DIMENSIONS = 3072
+FILLER_WORDS = (
+    "the assistant answers using the provided context and keeps the reply short "
+    "so that users can read it quickly on any device"
+).split()
+
+
+def fake_embedding(text, dimensions=DEFAULT_DIMENSIONS):
+    """Deterministic unit vector derived from the text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeOpenAIApp:
+    def __init__(
+        self,
+        first_token_latency=0.3,
+        tokens_per_second=50.0,
+        answer_tokens=60,
+        embedding_latency=0.05,
+        max_concurrent_chats=None,
+    ):
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.embedding_latency = embedding_latency
+        self.max_concurrent_chats = max_concurrent_chats
+        self.active_chats = 0
+        self.counters = {
+            "chat": 0,
+            "completions": 0,
+            "prompt_chars": 0,
+            "embeddings": 0,
+            "embedded_inputs": 0,
+            "rate_limited": 0,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        payload = json.loads(body or b"{}")
+
+        path = scope["path"].rstrip("/")
+        if path.endswith("/embeddings"):
+            await self._embeddings(payload, send)
+        elif path.endswith("/chat/completions"):
+            if self.max_concurrent_chats and self.active_chats >= self.max_concurrent_chats:
+                # Mimic the upstream quota: excess concurrent requests get a 429.
+                self.counters["rate_limited"] += 1
+                await self._json(send, 429, {"error": {"message": "Rate limit reached", "type": "requests"}})
+                return
+            self.active_chats += 1
+            try:
+                await self._chat(payload, send)
+            finally:
+                self.active_chats -= 1
+        else:
+            await self._json(send, 404, {"error": {"message": f"Unknown path {scope['path']}"}})
+
+    async def _json(self, send, status, data):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        await send({"type": "http.response.body", "body": json.dumps(data).encode("utf-8")})
+
+    async def _embeddings(self, payload, send):
+        self.counters["embeddings"] += 1
+        await asyncio.sleep(self.embedding_latency)
+
+        inputs = payload.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        self.counters["embedded_inputs"] += len(inputs)
+        dimensions = payload.get("dimensions") or DEFAULT_DIMENSIONS
+        as_base64 = payload.get("encoding_format") == "base64"
+
+        data = []
+        for index, text in enumerate(inputs):
+            vector = fake_embedding(str(text), dimensions)
+            embedding = base64.b64encode(vector.tobytes()).decode("ascii") if as_base64 else vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+
+        await self._json(
+            send,
+            200,
+            {
+                "object": "list",
+                "data": data,
+                "model": payload.get("model", ""),
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            },
+        )
+
+    async def _chat(self, payload, send):
+        self.counters["chat"] += 1
+        model = payload.get("model", "")
+        words = [FILLER_WORDS[index % len(FILLER_WORDS)] for index in range(self.answer_tokens)]
+        await asyncio.sleep(self.first_token_latency)
+
+        if not payload.get("stream"):
+            self.counters["completions"] += 1
+            await self._json(
+                send,
+                200,
+                {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": " ".join(words)},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                },
+            )
+            return
+
+        self.counters["prompt_chars"] += sum(len(str(item.get("content", ""))) for item in payload.get("messages", []))
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/event-stream")],
+            }
+        )
+        delay = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        for index, word in enumerate(words):
+            content = word if index == 0 else f" {word}"
+            await self._chunk(send, model, {"content": content}, None)
+            if delay:
+                await asyncio.sleep(delay)
+        await self._chunk(send, model, {}, "stop")
+        await send({"type": "http.response.body", "body": b"data: [DONE]\n\n"})
+
+    async def _chunk(self, send, model, delta, finish_reason):
+        chunk = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        await send(
+            {
+                "type": "http.response.body",
+                "body": f"data: {json.dumps(chunk)}\n\n".encode("utf-8"),
+                "more_body": True,
+            }
+        )
+
+
+def _free_port(host):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class FakeOpenAIServer:
+    """Run a FakeOpenAIApp under uvicorn on a background thread."""
+
+    def __init__(self, host="127.0.0.1", port=None, **options):
+        self.host = host
+        self.port = port or _free_port(host)
+        self.app = FakeOpenAIApp(**options)
+        self._server = uvicorn.Server(
+            uvicorn.Config(self.app, host=self.host, port=self.port, log_level="warning", lifespan="off")
+        )
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    def start(self, timeout=10):
+        self._thread = threading.Thread(target=self._server.run, name="fake-openai", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("Fake OpenAI server did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--max-concurrent-chats", type=int, help="Answer 429 above this many streams.")
+    args = parser.parse_args()
+
+    app = FakeOpenAIApp(
+        first_token_latency=args.first_token_latency,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        embedding_latency=args.embedding_latency,
+        max_concurrent_chats=args.max_concurrent_chats,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", lifespan="off")
+
+
+if __name__ == "__main__":
+    main()
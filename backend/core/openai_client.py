@@ -0,0 +1,117 @@
+"""Process-wide OpenAI clients with pooled keep-alive connections.
+
+The chat consumer and the rag embedding calls share one AsyncOpenAI per
+event loop (in practice one per worker process) and one blocking httpx
+client for the sync embedding path, so replies reuse warm connections
+instead of paying for a new pool each time; Celery tasks get blocking
+clients on the same pool from get_client. Pool size, keep-alive and
+timeouts come from the OPENAI_* settings. core.asgi closes the async
+client on lifespan shutdown.
+
+Setting OPENAI_SHARED_CLIENT to false brings back a fresh client per
+request, which is only useful for comparing the two in benchmarks.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from contextlib import asynccontextmanager
+
+import httpx
+from django.conf import settings
+from openai import AsyncOpenAI, OpenAI
+
+_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+_http_client = None
+_http_client_pid = None
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout():
+    return httpx.Timeout(settings.OPENAI_TIMEOUT, connect=settings.OPENAI_CONNECT_TIMEOUT)
+
+
+def _build_async_client():
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        http_client=httpx.AsyncClient(limits=_limits(), timeout=_timeout()),
+    )
+
+
+def get_async_client():
+    """The shared AsyncOpenAI for the running event loop.
+
+    httpx connections belong to the loop that opened them, so a process
+    running several loops (tests, management commands) gets one client per
+    loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed():
+        client = _async_clients[loop] = _build_async_client()
+    return client
+
+
+@asynccontextmanager
+async def async_openai():
+    """Yield an AsyncOpenAI for one request, honouring OPENAI_SHARED_CLIENT."""
+    if settings.OPENAI_SHARED_CLIENT:
+        yield get_async_client()
+        return
+
+    client = AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        max_retries=settings.OPENAI_MAX_RETRIES,
+    )
+    try:
+        yield client
+    finally:
+        await client.close()
+
+
+def get_http_client():
+    """Blocking httpx client for the llama-index embedding model.
+
+    Safe to share between threads; rebuilt after a fork so a Celery or
+    gunicorn child never reuses its parent's sockets.
+    """
+    global _http_client, _http_client_pid
+    with _lock:
+        if _http_client is None or _http_client.is_closed or _http_client_pid != os.getpid():
+            _http_client = httpx.Client(limits=_limits(), timeout=_timeout())
+            _http_client_pid = os.getpid()
+        return _http_client
+
+
+def get_client():
+    """Blocking OpenAI client on the shared connection pool, for Celery tasks."""
+    return OpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        http_client=get_http_client(),
+    )
+
+
+async def aclose_clients():
+    """Close the current loop's async client.
+
+    The blocking client is left open: the embedding model cached by
+    rag.store holds it and other threads may still be using it. It lives as
+    long as the process.
+    """
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
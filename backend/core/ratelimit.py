@@ -0,0 +1,232 @@
+"""Cluster-wide token buckets in Redis.
+
+Each check takes one token from every bucket that applies (per user and
+per client IP) in a single Lua script call, so limits hold across
+sockets, reconnects and worker processes, and a check costs one round
+trip. Limits are set per scope (``chat``, ``upload``) and role in
+settings.RATE_LIMITS as "<count>/<period>" strings, e.g. "6/30s" or
+"100/h".
+
+When Redis is unreachable the check fails open: a broken limiter should
+not take the chat down with it.
+"""
+
+import asyncio
+import logging
+import math
+import re
+import threading
+import time
+import weakref
+from collections import namedtuple
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "rl:"
+PERIOD_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+RATE_LIMIT_DECISIONS = metrics.counter(
+    "rate_limit_decisions_total",
+    "Rate limit checks by scope and outcome.",
+    ["scope", "outcome"],
+)
+
+# KEYS: one bucket per key. ARGV: now, cost, then capacity and refill rate
+# (tokens per second) for each key. Tokens are only taken when every bucket
+# has enough, otherwise the reply carries the wait until they all do.
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local levels = {}
+local wait = 0
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[1 + i * 2])
+    local rate = tonumber(ARGV[2 + i * 2])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local level = tonumber(state[1])
+    local updated = tonumber(state[2])
+    if level == nil or updated == nil then
+        level = capacity
+        updated = now
+    end
+    level = math.min(capacity, level + math.max(0, now - updated) * rate)
+    levels[i] = level
+    if level < cost then
+        wait = math.max(wait, (cost - level) / rate)
+    end
+end
+if wait > 0 then
+    return {0, tostring(wait)}
+end
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[1 + i * 2])
+    local rate = tonumber(ARGV[2 + i * 2])
+    redis.call('HSET', KEYS[i], 'tokens', tostring(levels[i] - cost), 'ts', tostring(now))
+    redis.call('PEXPIRE', KEYS[i], math.ceil(capacity / rate * 1000) + 1000)
+end
+return {1, '0'}
+"""
+
+Rate = namedtuple("Rate", ["capacity", "per_second"])
+
+
+def parse_rate(value):
+    """Parse "6/30s", "100/h" or "10/min" into a Rate; empty means no limit."""
+    if not value:
+        return None
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d*\.?\d*)\s*([a-z]*)\s*", str(value).lower())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Invalid rate {value!r}")
+    count, multiplier, unit = match.groups()
+    seconds = float(multiplier or 1) * PERIOD_UNITS.get(unit[:1] or "s", 0)
+    if seconds <= 0:
+        raise ValueError(f"Invalid rate {value!r}")
+    return Rate(int(count), int(count) / seconds)
+
+
+def role_for(user):
+    if user is None or not user.is_authenticated:
+        return "anonymous"
+    return "staff" if user.is_staff else "user"
+
+
+def client_ip(remote_addr, forwarded_for=None):
+    """The client address, seen through RATE_LIMIT_TRUSTED_PROXIES proxies.
+
+    Each trusted proxy appends the address it received the request from to
+    X-Forwarded-For, so the client is that many entries from the end.
+    Anything before it was written by the client and is ignored.
+    """
+    trusted = settings.RATE_LIMIT_TRUSTED_PROXIES
+    if trusted <= 0 or not forwarded_for:
+        return remote_addr
+    hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+    if not hops:
+        return remote_addr
+    return hops[-min(trusted, len(hops))]
+
+
+def request_ip(request):
+    """client_ip for a Django/DRF request."""
+    return client_ip(request.META.get("REMOTE_ADDR"), request.META.get("HTTP_X_FORWARDED_FOR"))
+
+
+def scope_ip(scope):
+    """client_ip for an ASGI (websocket) scope."""
+    client = scope.get("client")
+    forwarded_for = None
+    for name, value in scope.get("headers", ()):
+        if name == b"x-forwarded-for":
+            forwarded_for = value.decode("latin-1")
+            break
+    return client_ip(client[0] if client else None, forwarded_for)
+
+
+def buckets_for(scope, user=None, ip=None):
+    """The ``[(key, Rate)]`` buckets a request in ``scope`` draws from."""
+    limits = settings.RATE_LIMITS.get(scope, {})
+    buckets = []
+    role = role_for(user)
+    rate = parse_rate(limits.get(role))
+    if rate is not None and role != "anonymous":
+        buckets.append((f"{KEY_PREFIX}{scope}:user:{user.pk}", rate))
+    rate = parse_rate(limits.get("ip"))
+    if rate is not None and ip:
+        buckets.append((f"{KEY_PREFIX}{scope}:ip:{ip}", rate))
+    return buckets
+
+
+def _script_args(buckets, cost):
+    keys = [key for key, _ in buckets]
+    args = [repr(time.time()), cost]
+    for _, rate in buckets:
+        args.extend([rate.capacity, repr(rate.per_second)])
+    return keys, args
+
+
+def _decision(scope, reply):
+    allowed, wait = int(reply[0]), float(reply[1])
+    RATE_LIMIT_DECISIONS.inc(scope=scope, outcome="allowed" if allowed else "limited")
+    return None if allowed else max(1, math.ceil(wait))
+
+
+class RateLimiter:
+    """Token bucket checks against REDIS_URL.
+
+    ``check`` and ``acheck`` return None when the request may go ahead and
+    otherwise the number of seconds to wait before retrying.
+    """
+
+    def __init__(self, redis_url):
+        self.redis_url = redis_url
+        self._lock = threading.Lock()
+        self._client = None
+        self._script = None
+        self._async_scripts = weakref.WeakKeyDictionary()
+
+    def _sync_script(self):
+        with self._lock:
+            if self._script is None:
+                self._client = redis.Redis.from_url(
+                    self.redis_url,
+                    socket_timeout=0.25,
+                    socket_connect_timeout=0.25,
+                )
+                self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+            return self._script
+
+    def _async_script(self):
+        # redis.asyncio connections belong to the loop that opened them.
+        loop = asyncio.get_running_loop()
+        script = self._async_scripts.get(loop)
+        if script is None:
+            client = redis.asyncio.Redis.from_url(
+                self.redis_url,
+                socket_timeout=0.25,
+                socket_connect_timeout=0.25,
+            )
+            script = self._async_scripts[loop] = client.register_script(TOKEN_BUCKET_SCRIPT)
+        return script
+
+    def check(self, scope, buckets, cost=1):
+        if not settings.RATE_LIMIT_ENABLED or not buckets:
+            return None
+        keys, args = _script_args(buckets, cost)
+        try:
+            reply = self._sync_script()(keys=keys, args=args)
+        except redis.RedisError:
+            logger.warning("Rate limit check for %s failed; allowing", scope, exc_info=True)
+            RATE_LIMIT_DECISIONS.inc(scope=scope, outcome="error")
+            return None
+        return _decision(scope, reply)
+
+    async def acheck(self, scope, buckets, cost=1):
+        if not settings.RATE_LIMIT_ENABLED or not buckets:
+            return None
+        keys, args = _script_args(buckets, cost)
+        try:
+            reply = await self._async_script()(keys=keys, args=args)
+        except redis.RedisError:
+            logger.warning("Rate limit check for %s failed; allowing", scope, exc_info=True)
+            RATE_LIMIT_DECISIONS.inc(scope=scope, outcome="error")
+            return None
+        return _decision(scope, reply)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(settings.REDIS_URL)
+    return _limiter
@@ -1,7 +1,9 @@
 from django.urls import path
 
 from chat.consumers import ChatConsumer
+from documents.consumers import DocumentProgressConsumer
 
 websocket_urlpatterns = [
     path("ws/chat/", ChatConsumer.as_asgi()),
+    path("ws/documents/", DocumentProgressConsumer.as_asgi()),
 ]
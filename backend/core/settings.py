@@ -167,6 +167,8 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+JWT_USER_CACHE_TTL = int(os.getenv('JWT_USER_CACHE_TTL', '60'))
+
 DJOSER = {
     'USER_CREATE_PASSWORD_RETYPE': True,
 }
@@ -188,6 +190,20 @@ CSRF_TRUSTED_ORIGINS = [
 
 REDIS_URL = os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/0')
 
+# Shared by every worker process, so chat.middleware's user cache
+# invalidation reaches all of them.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_URL', REDIS_URL),
+        'KEY_PREFIX': 'cache',
+        'OPTIONS': {
+            'socket_timeout': 0.25,
+            'socket_connect_timeout': 0.25,
+        },
+    },
+}
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
@@ -197,13 +213,117 @@ CHANNEL_LAYERS = {
     },
 }
 
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+# Reverse proxies in front of the app (1 behind the App Platform router).
+# Per-IP limits take the client address that the outermost trusted proxy
+# appended to X-Forwarded-For; with 0 the header is ignored.
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv('RATE_LIMIT_TRUSTED_PROXIES', '0'))
+RATE_LIMITS = {
+    'chat': {
+        'user': os.getenv('RATE_LIMIT_CHAT_USER', '6/30s'),
+        'staff': os.getenv('RATE_LIMIT_CHAT_STAFF', '30/30s'),
+        'ip': os.getenv('RATE_LIMIT_CHAT_IP', '20/30s'),
+    },
+    'upload': {
+        'user': os.getenv('RATE_LIMIT_UPLOAD_USER', '10/h'),
+        'staff': os.getenv('RATE_LIMIT_UPLOAD_STAFF', '60/h'),
+        'ip': os.getenv('RATE_LIMIT_UPLOAD_IP', '120/h'),
+    },
+}
+
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_URL)
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', REDIS_URL)
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+CELERY_BEAT_SCHEDULE = {
+    'archive-chat-sessions': {
+        'task': 'chat.tasks.archive_chat_sessions',
+        'schedule': float(os.getenv('CHAT_RETENTION_INTERVAL', '3600')),
+    },
+}
+
+# Sessions idle for longer than this many days are moved to ArchivedSession
+# by chat.tasks.archive_chat_sessions. 0 (the default) keeps everything;
+# operators opt in by setting a number of days.
+CHAT_RETENTION_DAYS = int(os.getenv('CHAT_RETENTION_DAYS', '0'))
+CHAT_RETENTION_BATCH_SIZE = int(os.getenv('CHAT_RETENTION_BATCH_SIZE', '200'))
 
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
 OPENAI_CHAT_MODEL = os.getenv('OPENAI_CHAT_MODEL', 'gpt-4o-mini')
 OPENAI_EMBED_MODEL = os.getenv('OPENAI_EMBED_MODEL', 'text-embedding-3-large')
+OPENAI_EMBED_DIMENSIONS = int(os.getenv('OPENAI_EMBED_DIMENSIONS', '0')) or None
+OPENAI_SHARED_CLIENT = os.getenv('OPENAI_SHARED_CLIENT', 'True').lower() == 'true'
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '100'))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('OPENAI_MAX_KEEPALIVE_CONNECTIONS', '20'))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', '30'))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv('OPENAI_CONNECT_TIMEOUT', '5'))
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '60'))
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '2'))
 CHROMA_PERSIST_DIR = os.getenv('CHROMA_PERSIST_DIR', str(BASE_DIR / 'vector_store'))
+
+RAG_EMBED_CACHE_SIZE = int(os.getenv('RAG_EMBED_CACHE_SIZE', '1024'))
+RAG_EMBED_CACHE_TTL = int(os.getenv('RAG_EMBED_CACHE_TTL', '3600'))
+RAG_EMBED_CACHE_REDIS = os.getenv('RAG_EMBED_CACHE_REDIS', 'False').lower() == 'true'
+
+CHAT_ANSWER_CACHE_ENABLED = os.getenv('CHAT_ANSWER_CACHE_ENABLED', 'False').lower() == 'true'
+CHAT_ANSWER_CACHE_THRESHOLD = float(os.getenv('CHAT_ANSWER_CACHE_THRESHOLD', '0.95'))
+CHAT_ANSWER_CACHE_SIZE = int(os.getenv('CHAT_ANSWER_CACHE_SIZE', '256'))
+CHAT_ANSWER_CACHE_TTL = int(os.getenv('CHAT_ANSWER_CACHE_TTL', '86400'))
+
+CHAT_STREAM_FLUSH_INTERVAL_MS = int(os.getenv('CHAT_STREAM_FLUSH_INTERVAL_MS', '40'))
+CHAT_STREAM_FLUSH_BYTES = int(os.getenv('CHAT_STREAM_FLUSH_BYTES', '1024'))
+
+# Prompt history is the newest messages that fit this many tokens; older
+# ones are folded into ChatSession.summary after the answer.
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv('CHAT_HISTORY_TOKEN_BUDGET', '1000'))
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv('CHAT_HISTORY_MAX_MESSAGES', '20'))
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv('CHAT_SUMMARY_MAX_TOKENS', '300'))
+CHAT_SUMMARY_MODEL = os.getenv('CHAT_SUMMARY_MODEL', OPENAI_CHAT_MODEL)
+
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', '64'))
+LLM_CLUSTER_MAX_CONCURRENCY = int(os.getenv('LLM_CLUSTER_MAX_CONCURRENCY', '48'))
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', '30'))
+LLM_SLOT_TTL = float(os.getenv('LLM_SLOT_TTL', '120'))
+LLM_SLOT_POLL_INTERVAL = float(os.getenv('LLM_SLOT_POLL_INTERVAL', '0.05'))
+
+RAG_RETRIEVAL_CONCURRENCY = int(os.getenv('RAG_RETRIEVAL_CONCURRENCY', '32'))
+RAG_RETRIEVAL_WORKERS = int(os.getenv('RAG_RETRIEVAL_WORKERS', '4'))
+
+# Extraction processes per document. The Celery worker needs a non-daemonic
+# pool (--pool threads, as in the Procfile) to start them; under prefork,
+# pages are extracted serially inside the task.
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', str(min(4, os.cpu_count() or 1))))
+PDF_EXTRACT_PAGES_PER_TASK = int(os.getenv('PDF_EXTRACT_PAGES_PER_TASK', '8'))
+PDF_EXTRACT_WINDOW = int(os.getenv('PDF_EXTRACT_WINDOW', '0')) or None
+DOCUMENT_PROGRESS_INTERVAL = float(os.getenv('DOCUMENT_PROGRESS_INTERVAL', '1.0'))
+
+RAG_CHUNK_SIZE = int(os.getenv('RAG_CHUNK_SIZE', '900'))
+RAG_CHUNK_OVERLAP = int(os.getenv('RAG_CHUNK_OVERLAP', '120'))
+RAG_EMBED_BATCH_SIZE = int(os.getenv('RAG_EMBED_BATCH_SIZE', '64'))
+RAG_EMBED_CONCURRENCY = int(os.getenv('RAG_EMBED_CONCURRENCY', '4'))
+RAG_EMBED_MAX_RETRIES = int(os.getenv('RAG_EMBED_MAX_RETRIES', '5'))
+RAG_EMBED_BACKOFF_SECONDS = float(os.getenv('RAG_EMBED_BACKOFF_SECONDS', '1.0'))
+
+RAG_LEXICAL_ENABLED = os.getenv('RAG_LEXICAL_ENABLED', 'True').lower() == 'true'
+RAG_LEXICAL_CONFIDENCE = float(os.getenv('RAG_LEXICAL_CONFIDENCE', '0.8'))
+RAG_LEXICAL_MARGIN = float(os.getenv('RAG_LEXICAL_MARGIN', '1.5'))
+
+# Retrieved chunks are de-duplicated and packed into at most this many
+# tokens before they go into the prompt (rag.packing).
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv('RAG_CONTEXT_TOKEN_BUDGET', '3000'))
+RAG_CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv('RAG_CONTEXT_DUPLICATE_THRESHOLD', '0.8'))
+
+# Chunks scoring below this (cosine similarity, or normalized BM25 for
+# lexical-only hits) are not retrieved. When a standalone question
+# retrieves nothing, the chat answers NO_ANSWER_REPLY without calling the
+# model unless CHAT_NO_ANSWER_FAST_PATH is off.
+RAG_MIN_RELEVANCE = float(os.getenv('RAG_MIN_RELEVANCE', '0.25'))
+CHAT_NO_ANSWER_FAST_PATH = os.getenv('CHAT_NO_ANSWER_FAST_PATH', 'True').lower() == 'true'
+
+# /api/metrics/ takes METRICS_TOKEN as a bearer token; without one it is
+# only served to staff users.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False').lower() == 'true'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
@@ -0,0 +1,27 @@
+from rest_framework.throttling import BaseThrottle
+
+from core.ratelimit import buckets_for, get_rate_limiter, request_ip
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """DRF throttle backed by the shared Redis token buckets.
+
+    Subclasses set ``scope`` to one of the settings.RATE_LIMITS keys.
+    """
+
+    scope = None
+
+    def __init__(self):
+        self._wait = None
+
+    def allow_request(self, request, view):
+        buckets = buckets_for(self.scope, user=request.user, ip=request_ip(request))
+        self._wait = get_rate_limiter().check(self.scope, buckets)
+        return self._wait is None
+
+    def wait(self):
+        return self._wait
+
+
+class UploadThrottle(TokenBucketThrottle):
+    scope = "upload"
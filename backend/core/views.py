@@ -1,9 +1,45 @@
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+import secrets
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from core.metrics import registry
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def ping(request):
     return Response({"status": "ok"})
+
+
+@api_view(["GET"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def metrics(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404
+
+    if settings.METRICS_TOKEN:
+        auth_header = request.headers.get("Authorization", "")
+        if not secrets.compare_digest(auth_header, f"Bearer {settings.METRICS_TOKEN}"):
+            return HttpResponse(status=401)
+    else:
+        # Without a scrape token, only staff signed in with their usual JWT.
+        try:
+            authenticated = JWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            authenticated = None
+        if authenticated is None:
+            return HttpResponse(status=401)
+        if not authenticated[0].is_staff:
+            return HttpResponse(status=403)
+
+    return HttpResponse(
+        registry.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -0,0 +1,24 @@
+import json
+
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from documents.progress import PROGRESS_GROUP
+
+
+class DocumentProgressConsumer(AsyncWebsocketConsumer):
+    """Streams processing progress for all documents to staff users."""
+
+    async def connect(self):
+        user = self.scope["user"]
+        if user.is_anonymous or not user.is_staff:
+            await self.close(code=4403)
+            return
+
+        await self.channel_layer.group_add(PROGRESS_GROUP, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(PROGRESS_GROUP, self.channel_name)
+
+    async def document_progress(self, event):
+        await self.send(text_data=json.dumps({"type": "progress", "document": event["document"]}))
@@ -0,0 +1,93 @@
+import logging
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from pypdf import PdfReader
+
+logger = logging.getLogger(__name__)
+
+
+def _extract_range(path, start, stop):
+    reader = PdfReader(path)
+    return [reader.pages[index].extract_text() or "" for index in range(start, stop)]
+
+
+class PdfTextStream:
+    """Iterate over the text of a PDF page by page, in page order.
+
+    Page ranges are extracted in a process pool, with at most ``window``
+    ranges in flight, so memory is bounded by the window rather than by the
+    document. Pool processes are spawned, not forked, because the Celery
+    worker runs tasks on threads (``--pool threads`` in the Procfile); a
+    daemonic prefork child cannot start a pool at all, and then pages are
+    extracted in-process.
+    """
+
+    def __init__(self, path, workers=1, pages_per_task=8, window=None):
+        self.path = path
+        self.workers = max(1, workers)
+        self.pages_per_task = max(1, pages_per_task)
+        self.window = max(1, window or self.workers * 2)
+        self.page_count = len(PdfReader(path).pages)
+        self.pages_extracted = 0
+        self.seconds = 0.0
+        self.parallel = False
+
+    @property
+    def pages_per_second(self):
+        return self.pages_extracted / self.seconds if self.seconds else 0.0
+
+    def __iter__(self):
+        started = time.perf_counter()
+        try:
+            for text in self._iter_pages():
+                self.pages_extracted += 1
+                self.seconds = time.perf_counter() - started
+                yield text
+        finally:
+            self.seconds = time.perf_counter() - started
+
+    def _ranges(self):
+        for start in range(0, self.page_count, self.pages_per_task):
+            yield start, min(start + self.pages_per_task, self.page_count)
+
+    def _iter_pages(self):
+        if self.workers == 1 or self.page_count <= self.pages_per_task:
+            yield from self._iter_serial(0)
+            return
+
+        ranges = self._ranges()
+        pending = deque()
+        pool = None
+        try:
+            pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            for start, stop in ranges:
+                pending.append(pool.submit(_extract_range, self.path, start, stop))
+                if len(pending) >= self.window:
+                    break
+        except (AssertionError, OSError, NotImplementedError, BrokenProcessPool):
+            logger.warning("PDF extraction pool unavailable, extracting in-process", exc_info=True)
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            yield from self._iter_serial(0)
+            return
+
+        self.parallel = True
+        with pool:
+            while pending:
+                texts = pending.popleft().result()
+                next_range = next(ranges, None)
+                if next_range is not None:
+                    pending.append(pool.submit(_extract_range, self.path, *next_range))
+                yield from texts
+
+    def _iter_serial(self, start):
+        reader = PdfReader(self.path)
+        for index in range(start, self.page_count):
+            yield reader.pages[index].extract_text() or ""
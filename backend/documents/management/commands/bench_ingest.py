@@ -0,0 +1,124 @@
+import json
+import resource
+import shutil
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from core.celery import app as celery_app
+from core.fake_openai import FakeOpenAIServer
+from documents.models import Document
+from documents.synthetic import build_synthetic_pdf
+from documents.tasks import process_pdf
+from rag.store import get_runtime
+
+BENCH_USERNAME = "bench-ingest"
+
+
+def peak_rss_mb():
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own / 1024, children / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Run synthetic PDFs through process_pdf and ingest_segments with a local "
+        "deterministic embedding stub, reporting throughput, peak RSS and stage times."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, default=50)
+        parser.add_argument("--words-per-page", type=int, default=400, help="Text density.")
+        parser.add_argument("--runs", type=int, default=1)
+        parser.add_argument("--chunk-size", type=int, default=settings.RAG_CHUNK_SIZE)
+        parser.add_argument("--chunk-overlap", type=int, default=settings.RAG_CHUNK_OVERLAP)
+        parser.add_argument("--workers", type=int, default=settings.PDF_EXTRACT_WORKERS)
+        parser.add_argument("--embedding-latency", type=float, default=0.0)
+        parser.add_argument("--seed", type=int, help="Fixed text seed; repeats hit the embedding cache.")
+        parser.add_argument("--output", help="Write results as JSON to this path.")
+
+    def handle(self, *args, **options):
+        user, _ = get_user_model().objects.get_or_create(username=BENCH_USERNAME)
+        store_dir = tempfile.mkdtemp(prefix="bench-vectors-")
+        server = FakeOpenAIServer(embedding_latency=options["embedding_latency"])
+        overrides = {
+            "OPENAI_API_KEY": settings.OPENAI_API_KEY or "bench",
+            "OPENAI_BASE_URL": server.base_url,
+            "CHROMA_PERSIST_DIR": store_dir,
+            "RAG_CHUNK_SIZE": options["chunk_size"],
+            "RAG_CHUNK_OVERLAP": options["chunk_overlap"],
+            "PDF_EXTRACT_WORKERS": options["workers"],
+            "CHANNEL_LAYERS": {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+        }
+
+        results = []
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        try:
+            with server, override_settings(**overrides):
+                get_runtime().reset()
+                for run in range(options["runs"]):
+                    results.append(self._run_once(user, run, options))
+        finally:
+            celery_app.conf.task_always_eager = eager
+            get_runtime().reset()
+            shutil.rmtree(store_dir, ignore_errors=True)
+
+        self._print(results)
+        if options["output"]:
+            with open(options["output"], "w") as handle:
+                json.dump({"options": self._options(options), "runs": results}, handle, indent=2)
+
+    def _options(self, options):
+        keys = ("pages", "words_per_page", "chunk_size", "chunk_overlap", "workers", "embedding_latency")
+        return {key: options[key] for key in keys}
+
+    def _run_once(self, user, run, options):
+        seed = options["seed"] if options["seed"] is not None else uuid.uuid4().int
+        pdf = build_synthetic_pdf(options["pages"], options["words_per_page"], seed=seed)
+        document = Document(title=f"Bench {options['pages']}p run {run}", uploaded_by=user)
+        document.file.save(f"bench-{uuid.uuid4().hex}.pdf", ContentFile(pdf), save=True)
+
+        try:
+            started = time.perf_counter()
+            task_result = process_pdf(document.id)
+            elapsed = time.perf_counter() - started
+        finally:
+            document.file.delete(save=False)
+            document.delete()
+
+        own_rss, children_rss = peak_rss_mb()
+        return {
+            "status": task_result["status"],
+            "pdf_mb": len(pdf) / (1024 * 1024),
+            "pages": task_result["pages"],
+            "chunks": task_result["chunks"],
+            "seconds": elapsed,
+            "pages_per_second": task_result["pages"] / elapsed if elapsed else 0.0,
+            "chunks_per_second": task_result["chunks"] / elapsed if elapsed else 0.0,
+            "stages": task_result["stages"],
+            "peak_rss_mb": own_rss,
+            "peak_child_rss_mb": children_rss,
+        }
+
+    def _print(self, results):
+        self.stdout.write(
+            f"{'run':>3} {'pages':>6} {'chunks':>6} {'secs':>7} {'pages/s':>8} {'chunks/s':>8} "
+            f"{'parse':>7} {'split':>7} {'embed':>7} {'write':>7} {'rss_mb':>7}"
+        )
+        for index, row in enumerate(results):
+            stages = row["stages"]
+            self.stdout.write(
+                f"{index:>3} {row['pages']:>6} {row['chunks']:>6} {row['seconds']:>7.2f} "
+                f"{row['pages_per_second']:>8.1f} {row['chunks_per_second']:>8.1f} "
+                f"{stages.get('parse', 0):>7.2f} {stages.get('split', 0):>7.2f} "
+                f"{stages.get('embed', 0):>7.2f} {stages.get('write', 0):>7.2f} "
+                f"{row['peak_rss_mb']:>7.0f}"
+            )
@@ -0,0 +1,83 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from documents.models import Document
+from rag.indexing import delete_vectors, publish_corpus_change
+from rag.store import get_chroma_collection
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete vectors whose document no longer exists (or that carry no document_id), "
+        "and legacy duplicates of documents that have been re-processed. Run it once after "
+        "upgrading from ingests without deterministic vector ids, and again after re-processing "
+        "or deleting documents indexed that way."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        collection = get_chroma_collection()
+        live_ids = {str(pk) for pk in Document.objects.values_list("id", flat=True)}
+        batch_size = options["batch_size"]
+
+        scanned = 0
+        orphaned = []
+        # Legacy vectors (random ids from older ingests) are duplicates only
+        # when their document also has deterministic ones; otherwise they are
+        # still the document's only copy.
+        legacy = {}
+        reprocessed = set()
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+            if not page["ids"]:
+                break
+            for vector_id, metadata in zip(page["ids"], page["metadatas"]):
+                document_id = self._document_id(metadata)
+                if document_id not in live_ids:
+                    orphaned.append(vector_id)
+                elif vector_id.startswith(f"{document_id}:"):
+                    reprocessed.add(document_id)
+                else:
+                    legacy.setdefault(document_id, []).append(vector_id)
+            scanned += len(page["ids"])
+            offset += len(page["ids"])
+        duplicates = [
+            vector_id
+            for document_id, vector_ids in legacy.items()
+            if document_id in reprocessed
+            for vector_id in vector_ids
+        ]
+
+        if options["dry_run"]:
+            self.stdout.write(
+                f"Scanned {scanned} vectors, {len(orphaned)} orphaned, "
+                f"{len(duplicates)} legacy duplicates (dry run)."
+            )
+            return
+
+        removed = delete_vectors(collection, orphaned, batch_size=batch_size)
+        deduplicated = delete_vectors(collection, duplicates, batch_size=batch_size)
+        if removed or deduplicated:
+            publish_corpus_change()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Scanned {scanned} vectors, removed {removed} orphaned "
+                f"and {deduplicated} legacy duplicates."
+            )
+        )
+
+    def _document_id(self, metadata):
+        metadata = metadata or {}
+        # Older ingests let llama-index overwrite the document_id field with
+        # its own ref doc id; the Document id survives in the node payload.
+        try:
+            node = json.loads(metadata.get("_node_content") or "{}")
+        except ValueError:
+            node = {}
+        document_id = node.get("metadata", {}).get("document_id", metadata.get("document_id"))
+        return str(document_id) if document_id is not None else None
@@ -0,0 +1,74 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:33
+
+from django.db import migrations, models
+
+
+def backfill_status(apps, schema_editor):
+    Document = apps.get_model('documents', 'Document')
+    Document.objects.filter(processed=True).update(status='indexed')
+    Document.objects.filter(processed=False).update(status='failed')
+
+
+def restore_processed(apps, schema_editor):
+    Document = apps.get_model('documents', 'Document')
+    Document.objects.filter(status='indexed').update(processed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='chunk_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='chunks_processed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='pages_processed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='pages_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='stage_durations',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('parsing', 'Parsing'), ('embedding', 'Embedding'), ('indexed', 'Indexed'), ('failed', 'Failed')], default='queued', max_length=20),
+        ),
+        migrations.RunPython(backfill_status, restore_processed),
+        migrations.RemoveField(
+            model_name='document',
+            name='processed',
+        ),
+    ]
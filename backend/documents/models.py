@@ -3,11 +3,50 @@ from django.db import models
 
 
 class Document(models.Model):
+	STATUS_QUEUED = "queued"
+	STATUS_PARSING = "parsing"
+	STATUS_EMBEDDING = "embedding"
+	STATUS_INDEXED = "indexed"
+	STATUS_FAILED = "failed"
+
+	STATUS_CHOICES = [
+		(STATUS_QUEUED, "Queued"),
+		(STATUS_PARSING, "Parsing"),
+		(STATUS_EMBEDDING, "Embedding"),
+		(STATUS_INDEXED, "Indexed"),
+		(STATUS_FAILED, "Failed"),
+	]
+
+	# Any state can go back to queued when the document is re-processed.
+	TRANSITIONS = {
+		STATUS_QUEUED: {STATUS_QUEUED, STATUS_PARSING, STATUS_FAILED},
+		STATUS_PARSING: {STATUS_QUEUED, STATUS_EMBEDDING, STATUS_INDEXED, STATUS_FAILED},
+		STATUS_EMBEDDING: {STATUS_QUEUED, STATUS_INDEXED, STATUS_FAILED},
+		STATUS_INDEXED: {STATUS_QUEUED},
+		STATUS_FAILED: {STATUS_QUEUED},
+	}
+
 	title = models.CharField(max_length=255)
 	file = models.FileField(upload_to="pdfs/")
 	uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-	processed = models.BooleanField(default=False)
+	status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+	error = models.TextField(blank=True)
+	pages_total = models.PositiveIntegerField(default=0)
+	pages_processed = models.PositiveIntegerField(default=0)
+	chunks_processed = models.PositiveIntegerField(default=0)
+	chunk_count = models.PositiveIntegerField(default=0)
+	stage_durations = models.JSONField(default=dict, blank=True)
+	processing_started_at = models.DateTimeField(null=True, blank=True)
+	processed_at = models.DateTimeField(null=True, blank=True)
 	created_at = models.DateTimeField(auto_now_add=True)
 
 	def __str__(self):
 		return self.title
+
+	def can_transition(self, status):
+		return status in self.TRANSITIONS[self.status]
+
+	def transition(self, status):
+		if not self.can_transition(status):
+			raise ValueError(f"Document {self.id} cannot go from {self.status} to {status}")
+		self.status = status
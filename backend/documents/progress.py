@@ -0,0 +1,114 @@
+"""Processing status updates for documents.
+
+process_pdf reports through a DocumentProgress, which moves the Document
+through its status machine, saves progress counters at most once per
+DOCUMENT_PROGRESS_INTERVAL seconds and pushes each update to the
+"documents" channel group for the admin page.
+"""
+
+import logging
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_GROUP = "documents"
+PROGRESS_FIELDS = [
+    "status",
+    "error",
+    "pages_total",
+    "pages_processed",
+    "chunks_processed",
+    "chunk_count",
+    "stage_durations",
+    "processing_started_at",
+    "processed_at",
+]
+
+
+def progress_payload(document):
+    return {
+        "id": document.id,
+        "status": document.status,
+        "error": document.error,
+        "pages_total": document.pages_total,
+        "pages_processed": document.pages_processed,
+        "chunks_processed": document.chunks_processed,
+        "chunk_count": document.chunk_count,
+        "stage_durations": document.stage_durations,
+    }
+
+
+def broadcast_progress(document):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(
+            PROGRESS_GROUP,
+            {"type": "document.progress", "document": progress_payload(document)},
+        )
+    except Exception:
+        # Live updates are best effort; the saved row is the source of truth.
+        logger.warning("Could not publish progress for document %s", document.id, exc_info=True)
+
+
+class DocumentProgress:
+    def __init__(self, document, interval=None):
+        self.document = document
+        self.interval = settings.DOCUMENT_PROGRESS_INTERVAL if interval is None else interval
+        self._flushed_at = 0.0
+
+    def start(self, pages_total):
+        document = self.document
+        if document.status != document.STATUS_QUEUED:
+            # Re-running a task, e.g. after a worker died mid-ingest.
+            document.transition(document.STATUS_QUEUED)
+        document.transition(document.STATUS_PARSING)
+        document.error = ""
+        document.pages_total = pages_total
+        document.pages_processed = 0
+        document.chunks_processed = 0
+        document.chunk_count = 0
+        document.stage_durations = {}
+        document.processing_started_at = timezone.now()
+        document.processed_at = None
+        self.flush()
+
+    def update(self, pages_processed, chunks_processed):
+        document = self.document
+        if document.status == document.STATUS_PARSING:
+            document.transition(document.STATUS_EMBEDDING)
+            self._flushed_at = 0.0
+        document.pages_processed = pages_processed
+        document.chunks_processed = chunks_processed
+        if time.monotonic() - self._flushed_at >= self.interval:
+            self.flush()
+
+    def finish(self, chunk_count, stage_durations):
+        document = self.document
+        document.transition(document.STATUS_INDEXED)
+        document.pages_processed = document.pages_total
+        document.chunks_processed = chunk_count
+        document.chunk_count = chunk_count
+        document.stage_durations = stage_durations
+        document.processed_at = timezone.now()
+        self.flush()
+
+    def fail(self, error, stage_durations=None):
+        document = self.document
+        document.transition(document.STATUS_FAILED)
+        document.error = error
+        if stage_durations is not None:
+            document.stage_durations = stage_durations
+        document.processed_at = timezone.now()
+        self.flush()
+
+    def flush(self):
+        self.document.save(update_fields=PROGRESS_FIELDS)
+        self._flushed_at = time.monotonic()
+        broadcast_progress(self.document)
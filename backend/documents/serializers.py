@@ -11,10 +11,30 @@ class DocumentSerializer(serializers.ModelSerializer):
             "title",
             "file",
             "uploaded_by",
-            "processed",
+            "status",
+            "error",
+            "pages_total",
+            "pages_processed",
+            "chunks_processed",
+            "chunk_count",
+            "stage_durations",
+            "processing_started_at",
+            "processed_at",
+            "created_at",
+        ]
+        read_only_fields = [
+            "uploaded_by",
+            "status",
+            "error",
+            "pages_total",
+            "pages_processed",
+            "chunks_processed",
+            "chunk_count",
+            "stage_durations",
+            "processing_started_at",
+            "processed_at",
             "created_at",
         ]
-        read_only_fields = ["uploaded_by", "processed", "created_at"]
 
     def validate_file(self, value):
         if not value.name.lower().endswith(".pdf"):
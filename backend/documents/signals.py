@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from documents.models import Document
+from documents.tasks import remove_document_vectors
+
+
+@receiver(post_delete, sender=Document)
+def remove_vectors_on_delete(sender, instance, **kwargs):
+    document_id = instance.id
+    transaction.on_commit(lambda: remove_document_vectors.delay(document_id))
@@ -0,0 +1,84 @@
+"""Synthetic PDFs for ingestion benchmarks.
+
+Writes a minimal PDF by hand (one Helvetica text stream per page) so the
+benchmark needs nothing beyond the standard library.
+"""
+
+import random
+
+VOCABULARY = (
+    "account admin answer assistant backup billing browser cache chat client "
+    "configure connection dashboard data delete device document download email "
+    "error export feature file firewall folder install invoice key license log "
+    "manual message network notification password payment permission plan policy "
+    "profile report request reset restore role router schedule search security "
+    "server session setting storage subscription support sync token update upload "
+    "user version warranty webhook workspace"
+).split()
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def synthetic_page_lines(rng, words_per_page, words_per_line=12):
+    words = []
+    sentence_length = 0
+    for index in range(words_per_page):
+        word = rng.choice(VOCABULARY)
+        if rng.random() < 0.03:
+            word = f"E-{rng.randint(1000, 9999)}"
+        if sentence_length == 0:
+            word = word.capitalize()
+        sentence_length += 1
+        if sentence_length >= rng.randint(8, 20) or index == words_per_page - 1:
+            word += "."
+            sentence_length = 0
+        words.append(word)
+    return [" ".join(words[start:start + words_per_line]) for start in range(0, len(words), words_per_line)]
+
+
+def build_synthetic_pdf(pages=10, words_per_page=400, seed=None):
+    """Return the bytes of a PDF with ``pages`` pages of random prose."""
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for _ in range(pages):
+        lines = synthetic_page_lines(rng, words_per_page)
+        leading = min(12.0, 740.0 / max(len(lines), 1))
+        font_size = max(4.0, leading - 2)
+        commands = [f"BT /F1 {font_size:.1f} Tf {leading:.1f} TL 40 770 Td"]
+        commands.extend(f"({_escape(line)}) Tj T*" for line in lines)
+        commands.append("ET")
+        stream = "\n".join(commands).encode("latin-1")
+
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref_offset,
+    )
+    return bytes(output)
@@ -1,34 +1,85 @@
+import logging
+
 from celery import shared_task
 from django.conf import settings
-from pypdf import PdfReader
 
+from documents.extraction import PdfTextStream
 from documents.models import Document
-from rag.indexing import ingest_text
+from documents.progress import DocumentProgress
+from rag.indexing import delete_document_vectors, ingest_segments, publish_corpus_change
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
 def process_pdf(document_id):
     document = Document.objects.get(id=document_id)
-    reader = PdfReader(document.file.path)
-
-    text_parts = []
-    for page in reader.pages:
-        page_text = page.extract_text() or ""
-        text_parts.append(page_text)
-
-    text = "\n".join(text_parts).strip()
-    if not text:
-        document.processed = False
-        document.save(update_fields=["processed"])
-        return
-
-    success = ingest_text(
-        text,
-        metadata={
-            "document_id": str(document.id),
-            "title": document.title,
-        },
+    progress = DocumentProgress(document)
+    try:
+        pages = PdfTextStream(
+            document.file.path,
+            workers=settings.PDF_EXTRACT_WORKERS,
+            pages_per_task=settings.PDF_EXTRACT_PAGES_PER_TASK,
+            window=settings.PDF_EXTRACT_WINDOW,
+        )
+        progress.start(pages.page_count)
+
+        stats = ingest_segments(
+            pages,
+            metadata={"title": document.title},
+            chunk_size=settings.RAG_CHUNK_SIZE,
+            chunk_overlap=settings.RAG_CHUNK_OVERLAP,
+            document_id=document.id,
+            progress=lambda running: progress.update(pages.pages_extracted, running["chunks"]),
+        )
+        if stats is None:
+            progress.fail("Embeddings are not configured (OPENAI_API_KEY is empty).")
+            stats = {"chunks": 0, "added": 0, "removed": 0, "chunks_per_second": 0.0, "retries": 0, "stages": {}}
+        elif stats["added"] or stats["removed"]:
+            publish_corpus_change()
+    except Exception as exc:
+        logger.exception("Processing document %s failed", document.id)
+        progress.fail(f"{type(exc).__name__}: {exc}")
+        raise
+
+    stage_durations = {stage: round(seconds, 3) for stage, seconds in stats["stages"].items()}
+    if stats["chunks"]:
+        progress.finish(stats["chunks"], stage_durations)
+    elif document.status != document.STATUS_FAILED:
+        progress.fail("No text could be extracted from the PDF.", stage_durations)
+
+    logger.info(
+        "Processed document %s (%s): %s/%s pages in %.2fs (%.1f pages/s, parallel=%s), "
+        "%s chunks (%.1f chunks/s)",
+        document.id,
+        document.status,
+        pages.pages_extracted,
+        pages.page_count,
+        pages.seconds,
+        pages.pages_per_second,
+        pages.parallel,
+        stats["chunks"],
+        stats["chunks_per_second"],
     )
+    return {
+        "document_id": document.id,
+        "status": document.status,
+        "pages": pages.pages_extracted,
+        "chunks": stats["chunks"],
+        "chunks_added": stats["added"],
+        "chunks_removed": stats["removed"],
+        "chunks_per_second": stats["chunks_per_second"],
+        "embed_retries": stats["retries"],
+        "stages": stats["stages"],
+        "seconds": pages.seconds,
+        "pages_per_second": pages.pages_per_second,
+    }
+
 
-    document.processed = success
-    document.save(update_fields=["processed"])
+@shared_task
+def remove_document_vectors(document_id):
+    removed = delete_document_vectors(document_id)
+    if removed:
+        publish_corpus_change()
+    logger.info("Removed %s vectors for deleted document %s", removed, document_id)
+    return removed
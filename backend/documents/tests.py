@@ -1,3 +1,65 @@
+import json
+import uuid
+from io import StringIO
+from unittest import mock
+
+import chromadb
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from documents.models import Document
+
+
+def legacy_metadata(document_id):
+    # What llama-index's ChromaVectorStore wrote before chunks carried the
+    # Document as their source node.
+    ref_doc_id = str(uuid.uuid4())
+    node = {"id_": str(uuid.uuid4()), "metadata": {"document_id": str(document_id), "title": "Guide"}}
+    return {
+        "title": "Guide",
+        "_node_content": json.dumps(node),
+        "_node_type": "TextNode",
+        "document_id": ref_doc_id,
+        "doc_id": ref_doc_id,
+        "ref_doc_id": ref_doc_id,
+    }
+
+
+class CompactVectorsTests(TestCase):
+    def setUp(self):
+        client = chromadb.EphemeralClient()
+        name = f"test_{uuid.uuid4().hex}"
+        self.collection = client.create_collection(name)
+        self.addCleanup(client.delete_collection, name)
+        user = get_user_model().objects.create_user(username="ivan", password="pw")
+        self.reprocessed = Document.objects.create(title="Guide", file="pdfs/guide.pdf", uploaded_by=user)
+        self.untouched = Document.objects.create(title="Manual", file="pdfs/manual.pdf", uploaded_by=user)
+
+    def add(self, vector_id, metadata):
+        self.collection.add(ids=[vector_id], embeddings=[[1.0, 0.0]], metadatas=[metadata])
+
+    def compact(self, *args):
+        out = StringIO()
+        with mock.patch(
+            "documents.management.commands.compact_vectors.get_chroma_collection",
+            return_value=self.collection,
+        ), mock.patch("documents.management.commands.compact_vectors.publish_corpus_change") as publish:
+            call_command("compact_vectors", *args, stdout=out)
+        return out.getvalue(), publish
+
+    def test_legacy_duplicates_and_orphans_are_removed(self):
+        current = f"{self.reprocessed.id}:abc:0"
+        self.add(current, {"document_id": str(self.reprocessed.id), "title": "Guide"})
+        self.add("legacy-reprocessed", legacy_metadata(self.reprocessed.id))
+        self.add("legacy-untouched", legacy_metadata(self.untouched.id))
+        self.add("legacy-deleted", legacy_metadata(self.untouched.id + 100))
+
+        output, _ = self.compact("--dry-run")
+        self.assertIn("1 orphaned, 1 legacy duplicates", output)
+        self.assertEqual(len(self.collection.get()["ids"]), 4)
+
+        _, publish = self.compact()
+
+        self.assertEqual(sorted(self.collection.get()["ids"]), sorted([current, "legacy-untouched"]))
+        publish.assert_called_once()
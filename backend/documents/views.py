@@ -1,5 +1,6 @@
 from rest_framework import permissions, viewsets
 
+from core.throttling import UploadThrottle
 from documents.models import Document
 from documents.serializers import DocumentSerializer
 from documents.tasks import process_pdf
@@ -9,9 +10,25 @@ class DocumentViewSet(viewsets.ModelViewSet):
 	serializer_class = DocumentSerializer
 	permission_classes = [permissions.IsAdminUser]
 
+	def get_throttles(self):
+		if self.action in ("create", "update", "partial_update"):
+			return [UploadThrottle()]
+		return super().get_throttles()
+
 	def get_queryset(self):
 		return Document.objects.order_by("-created_at")
 
 	def perform_create(self, serializer):
 		document = serializer.save(uploaded_by=self.request.user)
 		process_pdf.delay(document.id)
+
+	def perform_update(self, serializer):
+		# Title is part of every embedded chunk, so either change re-indexes.
+		reindex = "file" in serializer.validated_data or (
+			serializer.validated_data.get("title", serializer.instance.title) != serializer.instance.title
+		)
+		if reindex:
+			document = serializer.save(status=Document.STATUS_QUEUED)
+			process_pdf.delay(document.id)
+		else:
+			serializer.save()
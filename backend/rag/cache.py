@@ -0,0 +1,235 @@
+import hashlib
+import logging
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text):
+    return " ".join(str(text).split()).casefold()
+
+
+class EmbeddingCache:
+    """Query-embedding cache with an in-process LRU tier and optional Redis tier.
+
+    Entries are keyed on the normalized query text and the embedding model, so
+    switching OPENAI_EMBED_MODEL never serves vectors from the old model.
+    """
+
+    REDIS_PREFIX = "rag:qemb:"
+
+    def __init__(self, max_size=1024, ttl=3600, redis_url=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = redis.Redis.from_url(
+            redis_url,
+            socket_timeout=0.25,
+            socket_connect_timeout=0.25,
+        ) if redis_url else None
+        self._counters = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "redis_errors": 0,
+        }
+
+    def make_key(self, text, model):
+        digest = hashlib.sha256(f"{model}\x00{normalize_query(text)}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        vector = self.get_local(key)
+        if vector is None:
+            vector = self.get_remote(key)
+        return vector
+
+    def get_local(self, key):
+        """Look up the in-process tier only; never blocks on the network."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, vector = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._counters["local_hits"] += 1
+                    return vector
+                del self._entries[key]
+        return None
+
+    def get_remote(self, key):
+        vector = self._redis_get(key)
+        with self._lock:
+            if vector is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["redis_hits"] += 1
+        self._store_local(key, vector)
+        return vector
+
+    @property
+    def has_remote(self):
+        return self._redis is not None
+
+    def set(self, key, vector):
+        vector = list(vector)
+        self._store_local(key, vector)
+        self._redis_set(key, vector)
+
+    def _store_local(self, key, vector):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def _redis_get(self, key):
+        if self._redis is None:
+            return None
+        try:
+            raw = self._redis.get(self.REDIS_PREFIX + key)
+        except redis.RedisError:
+            self._record_redis_error()
+            return None
+        if raw is None:
+            return None
+        return array("f", raw).tolist()
+
+    def _redis_set(self, key, vector):
+        if self._redis is None:
+            return
+        try:
+            self._redis.set(self.REDIS_PREFIX + key, array("f", vector).tobytes(), ex=self.ttl)
+        except redis.RedisError:
+            self._record_redis_error()
+
+    def _record_redis_error(self):
+        with self._lock:
+            self._counters["redis_errors"] += 1
+        logger.warning("Embedding cache Redis tier unavailable", exc_info=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._entries)
+        lookups = stats["local_hits"] + stats["redis_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["local_hits"] + stats["redis_hits"]) / lookups if lookups else None
+        return stats
+
+
+class AnswerCache:
+    """Semantic cache of chat answers, scoped to one corpus generation.
+
+    Questions are matched by cosine similarity of their query embeddings. The
+    whole cache is dropped as soon as a lookup or store sees a newer corpus
+    generation, so answers never outlive the documents they were built from.
+    """
+
+    def __init__(self, threshold=0.95, max_size=256, ttl=86400):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._generation = None
+        self._vectors = []
+        self._entries = []
+        self._counters = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def _normalize(self, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _sync_generation(self, generation):
+        if self._generation != generation:
+            if self._entries:
+                self._counters["invalidations"] += 1
+            self._generation = generation
+            self._vectors = []
+            self._entries = []
+
+    def lookup(self, embedding, generation):
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            self._sync_generation(generation)
+            live = [index for index, (expires_at, _) in enumerate(self._entries) if expires_at > now]
+            if len(live) != len(self._entries):
+                self._vectors = [self._vectors[index] for index in live]
+                self._entries = [self._entries[index] for index in live]
+            if self._vectors:
+                similarities = np.stack(self._vectors) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._counters["hits"] += 1
+                    return self._entries[best][1]
+            self._counters["misses"] += 1
+            return None
+
+    def store(self, embedding, answer, generation):
+        if self.max_size <= 0 or not answer:
+            return
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._sync_generation(generation)
+            self._vectors.append(vector)
+            self._entries.append((time.monotonic() + self.ttl, answer))
+            if len(self._entries) > self.max_size:
+                del self._vectors[0]
+                del self._entries[0]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._entries)
+            stats["generation"] = self._generation
+        return stats
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(
+                    max_size=settings.RAG_EMBED_CACHE_SIZE,
+                    ttl=settings.RAG_EMBED_CACHE_TTL,
+                    redis_url=settings.REDIS_URL if settings.RAG_EMBED_CACHE_REDIS else None,
+                )
+    return _embedding_cache
+
+
+_answer_cache = None
+
+
+def get_answer_cache():
+    global _answer_cache
+    if _answer_cache is None:
+        with _embedding_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = AnswerCache(
+                    threshold=settings.CHAT_ANSWER_CACHE_THRESHOLD,
+                    max_size=settings.CHAT_ANSWER_CACHE_SIZE,
+                    ttl=settings.CHAT_ANSWER_CACHE_TTL,
+                )
+    return _answer_cache
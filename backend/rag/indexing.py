@@ -1,27 +1,339 @@
+import hashlib
+import logging
+import random
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
 from django.conf import settings
-from llama_index.core import Document, Settings, VectorStoreIndex
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.embeddings.openai import OpenAIEmbedding
+from llama_index.core.schema import MetadataMode, NodeRelationship, RelatedNodeInfo, TextNode
 
-from rag.store import get_storage_context
+from rag.lexical import build_lexical_index
+from rag.models import EmbeddingCacheEntry
+from rag.store import build_embed_model, bump_generation, get_runtime
 
+logger = logging.getLogger(__name__)
 
-def ingest_text(text, metadata=None, chunk_size=900, chunk_overlap=120):
+# How many chunks' worth of text is buffered before the splitter runs;
+# iter_chunks turns this into a character count (flush_chars).
+SPLIT_BUFFER_CHUNKS = 8
+CHARS_PER_TOKEN = 4
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+def iter_chunks(segments, chunk_size=900, chunk_overlap=120):
+    """Split a stream of text segments into chunks without joining them all.
+
+    The last chunk of every split is carried into the next buffer so chunks
+    still flow across segment (page) boundaries.
+    """
+    splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    flush_chars = chunk_size * CHARS_PER_TOKEN * SPLIT_BUFFER_CHUNKS
+    buffer = ""
+    for segment in segments:
+        if not segment:
+            continue
+        buffer = f"{buffer}\n{segment}" if buffer else segment
+        if len(buffer) < flush_chars:
+            continue
+        chunks = splitter.split_text(buffer)
+        if len(chunks) > 1:
+            yield from chunks[:-1]
+            buffer = chunks[-1]
+
+    if buffer.strip():
+        yield from splitter.split_text(buffer)
+
+
+def timed(iterable, stages, stage):
+    """Yield from iterable, adding the time spent producing items to a stage."""
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            stages[stage] += time.perf_counter() - started
+            return
+        stages[stage] += time.perf_counter() - started
+        yield item
+
+
+def iter_batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_with_backoff(embed_model, texts, max_retries=None, base_delay=None):
+    """Embed one batch, retrying transient OpenAI failures with backoff.
+
+    This is the only retry layer, so embed_model should not retry on its
+    own (see build_embed_model). Returns the embeddings and the number of
+    retries it took.
+    """
+    max_retries = settings.RAG_EMBED_MAX_RETRIES if max_retries is None else max_retries
+    base_delay = settings.RAG_EMBED_BACKOFF_SECONDS if base_delay is None else base_delay
+    attempt = 0
+    while True:
+        try:
+            return embed_model.get_text_embedding_batch(texts), attempt
+        except RETRYABLE_ERRORS:
+            if attempt >= max_retries:
+                raise
+            delay = min(base_delay * (2 ** attempt), 60) * random.uniform(0.5, 1.5)
+            attempt += 1
+            logger.warning(
+                "Embedding batch of %s failed, retry %s/%s in %.1fs",
+                len(texts),
+                attempt,
+                max_retries,
+                delay,
+            )
+            time.sleep(delay)
+
+
+def chunk_cache_key(text):
+    """Content address of a chunk under the configured embedding model."""
+    payload = f"{settings.OPENAI_EMBED_MODEL}\x00{settings.OPENAI_EMBED_DIMENSIONS}\x00{text}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_cached_embeddings(keys):
+    rows = EmbeddingCacheEntry.objects.filter(key__in=set(keys)).values_list("key", "vector")
+    return {key: array("f", bytes(vector)).tolist() for key, vector in rows}
+
+
+def store_cached_embeddings(entries):
+    EmbeddingCacheEntry.objects.bulk_create(
+        [
+            EmbeddingCacheEntry(
+                key=key,
+                model=settings.OPENAI_EMBED_MODEL,
+                dimensions=len(vector),
+                vector=array("f", vector).tobytes(),
+            )
+            for key, vector in entries.items()
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def get_document_vector_ids(collection, document_id):
+    """Ids of the vectors ingest_segments stored for a document.
+
+    Vectors from ingests older than the deterministic ids are not found
+    here; compact_vectors removes those once a document has been
+    re-processed or deleted.
+    """
+    result = collection.get(where={"document_id": str(document_id)}, include=[])
+    return set(result["ids"])
+
+
+def delete_vectors(collection, ids, batch_size=500):
+    ids = list(ids)
+    for start in range(0, len(ids), batch_size):
+        collection.delete(ids=ids[start:start + batch_size])
+    return len(ids)
+
+
+def delete_document_vectors(document_id):
+    """Remove every vector stored for a document. Returns how many went."""
+    handles, _ = get_runtime().acquire()
+    ids = get_document_vector_ids(handles.collection, document_id)
+    return delete_vectors(handles.collection, ids)
+
+
+def publish_corpus_change():
+    """Rebuild derived indexes and bump the corpus generation.
+
+    Call after vectors were added or removed so every process refreshes its
+    runtime, lexical index and answer cache.
+    """
+    handles, _ = get_runtime().acquire()
+    build_lexical_index(handles.collection)
+    return bump_generation()
+
+
+def ingest_segments(
+    segments,
+    metadata=None,
+    chunk_size=900,
+    chunk_overlap=120,
+    document_id=None,
+    progress=None,
+):
+    """Chunk, embed and store a stream of text segments.
+
+    With a document_id, chunks get ids derived from their content and the
+    ingest becomes a diff against what is already stored for the document:
+    unchanged chunks are left alone, new ones are added and the ones that
+    disappeared are deleted at the end.
+
+    Chunks already in the embedding cache are reused; the rest are embedded
+    in batches of RAG_EMBED_BATCH_SIZE with up to RAG_EMBED_CONCURRENCY
+    batches in flight. Database and vector store access stay on the calling
+    thread. Returns ingestion stats, including the calling thread's time per
+    stage (parse, split, embed, write), or None when embeddings are not
+    configured. ``progress`` is called with the running stats after every
+    batch is written or skipped as unchanged.
+    """
     if not settings.OPENAI_API_KEY:
-        return False
+        return None
 
-    Settings.embed_model = OpenAIEmbedding(
-        api_key=settings.OPENAI_API_KEY,
-        model=settings.OPENAI_EMBED_MODEL,
+    handles, _ = get_runtime().acquire()
+    metadata = dict(metadata or {})
+    existing_ids = set()
+    relationships = {}
+    if document_id is not None:
+        # The Chroma store writes the source node id into the document_id
+        # metadata field, so the Document id has to be the source node.
+        metadata["document_id"] = str(document_id)
+        relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=str(document_id))
+        existing_ids = get_document_vector_ids(handles.collection, document_id)
+    concurrency = max(1, settings.RAG_EMBED_CONCURRENCY)
+    # embed_with_backoff does the retrying; retries inside the model would
+    # multiply with it.
+    embed_model = build_embed_model(max_retries=0)
+    stages = {"parse": 0.0, "split": 0.0, "embed": 0.0, "write": 0.0}
+    segments = timed(segments, stages, "parse")
+    # document_id stays out of the embedded text so a re-uploaded document
+    # hits the embedding cache for every chunk that did not change.
+    nodes = (
+        TextNode(
+            text=chunk,
+            metadata=dict(metadata),
+            relationships=dict(relationships),
+            excluded_embed_metadata_keys=["document_id"],
+            excluded_llm_metadata_keys=["document_id"],
+        )
+        for chunk in iter_chunks(segments, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        if chunk.strip()
     )
 
-    splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    document = Document(text=text, metadata=metadata or {})
+    stats = {
+        "chunks": 0,
+        "added": 0,
+        "batches": 0,
+        "retries": 0,
+        "cache_hits": 0,
+        "embedded": 0,
+        "unchanged": 0,
+        "removed": 0,
+    }
+    started = time.perf_counter()
+    seen_ids = {}
+
+    def write(batch, keys, cached, future, misses):
+        if future is not None:
+            waited = time.perf_counter()
+            embeddings, retries = future.result()
+            stages["embed"] += time.perf_counter() - waited
+            stats["retries"] += retries
+            stats["embedded"] += len(embeddings)
+        writing = time.perf_counter()
+        if future is not None:
+            fresh = dict(zip(misses, embeddings))
+            store_cached_embeddings(fresh)
+            cached.update(fresh)
+        for node, key in zip(batch, keys):
+            node.embedding = cached[key]
+        handles.vector_store.add(batch)
+        stages["write"] += time.perf_counter() - writing
+        stats["added"] += len(batch)
+        stats["batches"] += 1
+        report()
+
+    def report():
+        if progress is not None:
+            stats["chunks"] = stats["added"] + stats["unchanged"]
+            progress(stats)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="rag-embed") as pool:
+        pending = deque()
+        for batch in iter_batches(timed(nodes, stages, "split"), settings.RAG_EMBED_BATCH_SIZE):
+            texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+            keys = [chunk_cache_key(text) for text in texts]
+            if document_id is not None:
+                for node, key in zip(batch, keys):
+                    occurrence = seen_ids.get(key, 0)
+                    seen_ids[key] = occurrence + 1
+                    node.id_ = f"{document_id}:{key[:32]}:{occurrence}"
+                kept = [index for index, node in enumerate(batch) if node.id_ not in existing_ids]
+                stats["unchanged"] += len(batch) - len(kept)
+                existing_ids.difference_update(node.id_ for node in batch)
+                batch = [batch[index] for index in kept]
+                texts = [texts[index] for index in kept]
+                keys = [keys[index] for index in kept]
+                if not batch:
+                    report()
+                    continue
+            looking_up = time.perf_counter()
+            cached = load_cached_embeddings(keys)
+            stages["embed"] += time.perf_counter() - looking_up
+            stats["cache_hits"] += sum(1 for key in keys if key in cached)
+
+            # Duplicate chunks inside one batch are embedded once.
+            miss_texts = {}
+            for key, text in zip(keys, texts):
+                if key not in cached:
+                    miss_texts.setdefault(key, text)
+            future = None
+            if miss_texts:
+                future = pool.submit(embed_with_backoff, embed_model, list(miss_texts.values()))
+            pending.append((batch, keys, cached, future, list(miss_texts)))
+            if len(pending) >= concurrency * 2:
+                write(*pending.popleft())
+        while pending:
+            write(*pending.popleft())
 
-    storage_context = get_storage_context()
-    VectorStoreIndex.from_documents(
-        [document],
-        storage_context=storage_context,
-        node_parser=splitter,
+    if existing_ids:
+        removing = time.perf_counter()
+        stats["removed"] = delete_vectors(handles.collection, existing_ids)
+        stages["write"] += time.perf_counter() - removing
+
+    # Time pulling nodes includes pulling pages; keep the two apart.
+    stages["split"] -= stages["parse"]
+    stats["stages"] = stages
+    stats["chunks"] = stats["added"] + stats["unchanged"]
+    stats["seconds"] = time.perf_counter() - started
+    stats["chunks_per_second"] = stats["chunks"] / stats["seconds"] if stats["seconds"] else 0.0
+    logger.info(
+        "Ingested %s chunks (%s added, %s embedded, %s cached, %s unchanged, %s removed) "
+        "in %s batches in %.2fs (%.1f chunks/s, %s retries)",
+        stats["chunks"],
+        stats["added"],
+        stats["embedded"],
+        stats["cache_hits"],
+        stats["unchanged"],
+        stats["removed"],
+        stats["batches"],
+        stats["seconds"],
+        stats["chunks_per_second"],
+        stats["retries"],
+    )
+    return stats
+
+
+def ingest_text(text, metadata=None, chunk_size=900, chunk_overlap=120):
+    stats = ingest_segments(
+        [text],
+        metadata=metadata,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
     )
-    return True
+    return bool(stats and stats["chunks"])
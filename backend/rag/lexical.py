@@ -0,0 +1,185 @@
+import gzip
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_INDEX_FILENAME = "bm25.json.gz"
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._\-/][a-z0-9]+)*")
+
+
+def tokenize(text):
+    """Lowercased word tokens; codes like ``E-1042`` or ``v2.3`` stay whole."""
+    return TOKEN_RE.findall(str(text).lower())
+
+
+class BM25Index:
+    """Okapi BM25 over the chunks stored in the vector collection."""
+
+    def __init__(self, ids, texts, postings, doc_lengths, k1=1.5, b=0.75):
+        self.ids = ids
+        self.texts = texts
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, ids, texts, k1=1.5, b=0.75):
+        postings = {}
+        doc_lengths = []
+        for doc_index, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                postings.setdefault(term, []).append((doc_index, frequency))
+        return cls(list(ids), list(texts), postings, doc_lengths, k1=k1, b=b)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def idf(self, term):
+        document_frequency = len(self.postings.get(term, ()))
+        return math.log((len(self.ids) - document_frequency + 0.5) / (document_frequency + 0.5) + 1)
+
+    def search(self, query, top_k=5):
+        """Return ``(hits, confidence)``.
+
+        ``hits`` is a list of ``(id, text, score)``. ``confidence`` is the top
+        score relative to what an average-length chunk containing every query
+        term once would score, capped at 1, so it is comparable across
+        queries.
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.ids:
+            return [], 0.0
+
+        scores = {}
+        ceiling = 0.0
+        for term in terms:
+            postings = self.postings.get(term)
+            idf = self.idf(term)
+            ceiling += idf
+            if not postings:
+                continue
+            for doc_index, frequency in postings:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_index] / (self.avg_length or 1)
+                score = idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+                scores[doc_index] = scores.get(doc_index, 0.0) + score
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        hits = [(self.ids[index], self.texts[index], score) for index, score in ranked]
+        confidence = min(1.0, ranked[0][1] / ceiling) if ranked and ceiling else 0.0
+        return hits, confidence
+
+    def to_dict(self):
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "ids": self.ids,
+            "texts": self.texts,
+            "doc_lengths": self.doc_lengths,
+            "postings": self.postings,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        postings = {term: [tuple(entry) for entry in entries] for term, entries in data["postings"].items()}
+        return cls(
+            data["ids"],
+            data["texts"],
+            postings,
+            data["doc_lengths"],
+            k1=data["k1"],
+            b=data["b"],
+        )
+
+
+def _index_path():
+    return os.path.join(settings.CHROMA_PERSIST_DIR, LEXICAL_INDEX_FILENAME)
+
+
+# Rebuilds in one process (Celery runs tasks on threads) take turns, so a
+# rebuild that read the collection earlier cannot overwrite a later one.
+_build_lock = threading.Lock()
+
+
+def build_lexical_index(collection, page_size=1000):
+    """Rebuild the BM25 index from every chunk in the collection and save it."""
+    with _build_lock:
+        return _build_lexical_index(collection, page_size)
+
+
+def _build_lexical_index(collection, page_size):
+    ids = []
+    texts = []
+    offset = 0
+    while True:
+        page = collection.get(include=["documents"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        texts.extend(text or "" for text in page["documents"])
+        offset += len(page["ids"])
+
+    index = BM25Index.build(ids, texts)
+    os.makedirs(settings.CHROMA_PERSIST_DIR, exist_ok=True)
+    path = _index_path()
+    fd, tmp_path = tempfile.mkstemp(
+        dir=settings.CHROMA_PERSIST_DIR,
+        prefix=f"{LEXICAL_INDEX_FILENAME}.",
+        suffix=".tmp",
+    )
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as handle:
+            json.dump(index.to_dict(), handle)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    logger.info("Rebuilt BM25 index over %s chunks", len(index))
+    return index
+
+
+_loaded = {"generation": None, "index": None}
+_loaded_lock = threading.Lock()
+
+
+def get_lexical_index(generation):
+    """Return the on-disk BM25 index, reloading it when the corpus changes."""
+    if _loaded["generation"] == generation:
+        return _loaded["index"]
+    with _loaded_lock:
+        if _loaded["generation"] != generation:
+            try:
+                with gzip.open(_index_path(), "rt", encoding="utf-8") as handle:
+                    index = BM25Index.from_dict(json.load(handle))
+            except FileNotFoundError:
+                index = None
+            except (OSError, ValueError, KeyError):
+                logger.warning("Could not load BM25 index", exc_info=True)
+                index = None
+            _loaded["index"] = index
+            _loaded["generation"] = generation
+        return _loaded["index"]
+
+
+def reciprocal_rank_fusion(rankings, top_k=5, k=60):
+    """Fuse ranked lists of ``(id, text)`` pairs; returns ``[(id, text, score)]``."""
+    scores = {}
+    texts = {}
+    for ranking in rankings:
+        for rank, (item_id, text) in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+            texts.setdefault(item_id, text)
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return [(item_id, texts[item_id], score) for item_id, score in ranked]
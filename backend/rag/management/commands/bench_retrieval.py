@@ -0,0 +1,102 @@
+import asyncio
+import json
+import statistics
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from rag.retrieval import aretrieve_context, retrieve_context
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare sync_to_async(retrieve_context) with aretrieve_context under "
+        "N concurrent simulated sockets."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 200])
+        parser.add_argument("--queries", type=int, default=3, help="Queries per simulated socket.")
+        parser.add_argument("--query", default="How do I reset my password?")
+        parser.add_argument(
+            "--reuse-queries",
+            action="store_true",
+            help="Send the same text every time so the embedding cache is exercised.",
+        )
+        parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+
+    def handle(self, *args, **options):
+        if not settings.OPENAI_API_KEY:
+            raise CommandError("OPENAI_API_KEY is required to benchmark retrieval.")
+
+        # Warm the runtime once so both paths are measured warm.
+        retrieve_context(options["query"])
+
+        results = []
+        for concurrency in options["concurrency"]:
+            for name, runner in (
+                ("sync_to_async", self._run_sync_path),
+                ("async", self._run_async_path),
+            ):
+                results.append(asyncio.run(self._measure(name, runner, concurrency, options)))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(
+            f"{'path':<14} {'sockets':>7} {'calls':>6} {'wall_s':>8} {'calls/s':>8} "
+            f"{'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8}"
+        )
+        for row in results:
+            self.stdout.write(
+                f"{row['path']:<14} {row['concurrency']:>7} {row['calls']:>6} "
+                f"{row['wall_seconds']:>8.2f} {row['calls_per_second']:>8.1f} "
+                f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}"
+            )
+
+    async def _run_sync_path(self, query):
+        return await sync_to_async(retrieve_context)(query)
+
+    async def _run_async_path(self, query):
+        return await aretrieve_context(query)
+
+    async def _measure(self, name, runner, concurrency, options):
+        latencies = []
+        run_id = uuid.uuid4().hex[:8]
+
+        async def socket(socket_index):
+            for query_index in range(options["queries"]):
+                query = options["query"]
+                if not options["reuse_queries"]:
+                    query = f"{query} [{run_id}-{socket_index}-{query_index}]"
+                started = time.perf_counter()
+                await runner(query)
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(socket(index) for index in range(concurrency)))
+        wall = time.perf_counter() - started
+
+        return {
+            "path": name,
+            "concurrency": concurrency,
+            "calls": len(latencies),
+            "wall_seconds": wall,
+            "calls_per_second": len(latencies) / wall if wall else 0.0,
+            "mean_ms": statistics.mean(latencies) * 1000,
+            "p50_ms": _percentile(latencies, 0.50) * 1000,
+            "p95_ms": _percentile(latencies, 0.95) * 1000,
+            "p99_ms": _percentile(latencies, 0.99) * 1000,
+        }
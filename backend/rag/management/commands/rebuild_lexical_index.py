@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from rag.indexing import publish_corpus_change
+
+
+class Command(BaseCommand):
+    help = "Rebuild the BM25 lexical index from the Chroma collection."
+
+    def handle(self, *args, **options):
+        generation = publish_corpus_change()
+        self.stdout.write(self.style.SUCCESS(f"Lexical index rebuilt (generation {generation})."))
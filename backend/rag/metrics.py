@@ -0,0 +1,52 @@
+from core import metrics
+from rag.cache import get_answer_cache, get_embedding_cache
+from rag.retrieval import retrieval_stats
+from rag.store import get_runtime
+
+
+@metrics.registry.add_collector
+def collect_rag_stats():
+    samples = []
+
+    for name, value in get_embedding_cache().stats().items():
+        if name in ("local_hits", "redis_hits", "misses", "evictions", "redis_errors"):
+            samples.append(
+                ("rag_embedding_cache_total", "counter", "Query-embedding cache events.", {"event": name}, value)
+            )
+    for name, value in get_answer_cache().stats().items():
+        if name in ("hits", "misses", "invalidations"):
+            samples.append(
+                ("rag_answer_cache_total", "counter", "Semantic answer cache events.", {"event": name}, value)
+            )
+
+    for path, entry in retrieval_stats.snapshot()["paths"].items():
+        samples.append(
+            ("rag_retrieval_calls_total", "counter", "Retrievals by path.", {"path": path}, entry["calls"])
+        )
+        samples.append(
+            (
+                "rag_retrieval_seconds_total",
+                "counter",
+                "Total retrieval time by path.",
+                {"path": path},
+                entry["seconds_total"],
+            )
+        )
+
+    runtime = get_runtime().stats()
+    samples.append(
+        (
+            "rag_runtime_cold_start_seconds",
+            "gauge",
+            "Time the vector runtime took to build on first use.",
+            {},
+            runtime["cold_start_seconds"],
+        )
+    )
+    samples.append(
+        ("rag_runtime_refreshes_total", "counter", "Vector runtime refreshes.", {}, runtime["refreshes"])
+    )
+    samples.append(
+        ("rag_corpus_generation", "gauge", "Corpus generation loaded by this process.", {}, runtime["generation"])
+    )
+    return samples
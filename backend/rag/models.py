@@ -1,3 +1,12 @@
 from django.db import models
 
-# Create your models here.
+
+class EmbeddingCacheEntry(models.Model):
+	key = models.CharField(max_length=64, unique=True)
+	model = models.CharField(max_length=100)
+	dimensions = models.PositiveIntegerField()
+	vector = models.BinaryField()
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	def __str__(self):
+		return f"{self.model}/{self.dimensions}: {self.key[:12]}"
@@ -0,0 +1,124 @@
+"""Pack retrieved chunks into the prompt's context block.
+
+Chunks arrive in relevance order and often repeat each other: neighbours
+from SentenceSplitter share RAG_CHUNK_OVERLAP tokens, and near-identical
+pages produce near-identical chunks. pack_context
+
+- drops a chunk when most of its word shingles already appear in the
+  chunks kept before it,
+- trims text a kept chunk already ends or starts with, and
+- keeps chunks in relevance order while they fit RAG_CONTEXT_TOKEN_BUDGET.
+"""
+
+import logging
+import re
+
+from django.conf import settings
+
+from rag.tokens import count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_SIZE = 5
+# Shortest shared run of words treated as split overlap rather than chance.
+MIN_OVERLAP_WORDS = 8
+MAX_OVERLAP_WORDS = 400
+SEPARATOR = "\n\n"
+
+
+def _offset_after(text, count):
+    """Character offset just past the first ``count`` words of ``text``."""
+    return re.match(r"(?:\s*\S+){%d}" % count, text).end() if count else 0
+
+
+def _words(text):
+    # casefold never turns a character into whitespace, so word i here is
+    # word i of the original text.
+    return text.casefold().split()
+
+
+def shingles(words, size=SHINGLE_SIZE):
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return set(zip(*(words[offset:] for offset in range(size))))
+
+
+def _overlap(left, right):
+    """Number of words at the end of ``left`` that ``right`` starts with."""
+    if len(left) < MIN_OVERLAP_WORDS or len(right) < MIN_OVERLAP_WORDS:
+        return 0
+    first = right[0]
+    longest = min(len(left), len(right), MAX_OVERLAP_WORDS)
+    # Only positions where right's first word occurs can start an overlap.
+    for start in range(len(left) - longest, len(left) - MIN_OVERLAP_WORDS + 1):
+        if left[start] == first and left[start:] == right[: len(left) - start]:
+            return len(left) - start
+    return 0
+
+
+def _trim_overlaps(text, words, kept_words):
+    start, end = 0, len(words)
+    for other in kept_words:
+        start = max(start, _overlap(other, words))
+        end = min(end, len(words) - _overlap(words, other))
+    if start >= end:
+        return ""
+    if start == 0 and end == len(words):
+        return text
+    return text[_offset_after(text, start):_offset_after(text, end)]
+
+
+def pack_context(chunks, budget=None, duplicate_threshold=None):
+    """Return ``(packed_chunks, stats)`` for chunks given best first."""
+    budget = settings.RAG_CONTEXT_TOKEN_BUDGET if budget is None else budget
+    threshold = settings.RAG_CONTEXT_DUPLICATE_THRESHOLD if duplicate_threshold is None else duplicate_threshold
+
+    packed = []
+    kept_words = []
+    seen = set()
+    used = 0
+    stats = {
+        "chunks_in": len(chunks),
+        "duplicates": 0,
+        "over_budget": 0,
+        "tokens_before": count_tokens(SEPARATOR.join(chunks)),
+    }
+    for chunk in chunks:
+        words = _words(chunk)
+        chunk_shingles = shingles(words)
+        if not chunk_shingles or len(chunk_shingles & seen) / len(chunk_shingles) >= threshold:
+            stats["duplicates"] += 1
+            continue
+
+        text = _trim_overlaps(chunk, words, kept_words).strip()
+        if not text:
+            stats["duplicates"] += 1
+            continue
+
+        tokens = count_tokens(text) + (count_tokens(SEPARATOR) if packed else 0)
+        if used + tokens > budget:
+            if packed:
+                stats["over_budget"] += 1
+                continue
+            # Never send an empty context because the best chunk is too big.
+            text = truncate_tokens(text, budget)
+            tokens = count_tokens(text)
+
+        packed.append(text)
+        kept_words.append(words)
+        seen |= chunk_shingles
+        used += tokens
+
+    stats["chunks_out"] = len(packed)
+    stats["tokens_after"] = count_tokens(SEPARATOR.join(packed))
+    if chunks:
+        logger.info(
+            "Packed context: %s -> %s chunks, %s -> %s tokens (%s duplicates, %s over budget)",
+            stats["chunks_in"],
+            stats["chunks_out"],
+            stats["tokens_before"],
+            stats["tokens_after"],
+            stats["duplicates"],
+            stats["over_budget"],
+        )
+    return packed, stats
@@ -1,5 +1,14 @@
+NO_ANSWER_REPLY = "I do not have information about that."
+
 SYSTEM_PROMPT = (
     "You are a professional website assistant.\n"
     "Only answer using the provided context.\n"
-    "If answer is not found, say: \"I do not have information about that.\""
+    f"If answer is not found, say: \"{NO_ANSWER_REPLY}\""
+)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and a website assistant.\n"
+    "Merge the new messages into the current summary.\n"
+    "Keep facts, names, decisions and open questions; drop pleasantries.\n"
+    "Reply with the updated summary only, in a few short sentences."
 )
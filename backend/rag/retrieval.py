@@ -1,20 +1,239 @@
+import asyncio
+import math
+import threading
+import time
+import weakref
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
 from django.conf import settings
-from llama_index.core import Settings, VectorStoreIndex
-from llama_index.embeddings.openai import OpenAIEmbedding
+from llama_index.core.schema import QueryBundle
+
+from core.openai_client import async_openai
+from rag.cache import get_embedding_cache
+from rag.lexical import get_lexical_index, reciprocal_rank_fusion
+from rag.store import get_runtime
+
+PATH_LEXICAL = "lexical"
+PATH_FUSED = "fused"
+PATH_VECTOR = "vector"
+
+_executor = None
+_executor_lock = threading.Lock()
+_semaphores = weakref.WeakKeyDictionary()
+
+# ``score`` is the chunk's relevance on a 0-1 scale: the cosine similarity
+# for vector hits, and for chunks only the lexical index found, the BM25
+# score relative to a chunk matching every query term (as in
+# LexicalIndex.search's confidence).
+RetrievedChunk = namedtuple("RetrievedChunk", ["text", "score"])
+
+
+class RetrievalStats:
+    """Call counts and latency per retrieval path."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths = {}
+
+    def record(self, path, seconds):
+        with self._lock:
+            entry = self._paths.setdefault(path, {"calls": 0, "seconds_total": 0.0, "seconds_max": 0.0})
+            entry["calls"] += 1
+            entry["seconds_total"] += seconds
+            entry["seconds_max"] = max(entry["seconds_max"], seconds)
+
+    def snapshot(self):
+        with self._lock:
+            paths = {path: dict(entry) for path, entry in self._paths.items()}
+        total = sum(entry["calls"] for entry in paths.values())
+        for entry in paths.values():
+            entry["seconds_avg"] = entry["seconds_total"] / entry["calls"]
+        lexical_calls = paths.get(PATH_LEXICAL, {}).get("calls", 0)
+        return {
+            "paths": paths,
+            "calls": total,
+            "lexical_hit_rate": lexical_calls / total if total else None,
+        }
+
 
-from rag.store import get_vector_store
+retrieval_stats = RetrievalStats()
 
 
-def retrieve_context(query, top_k=5):
+def get_retrieval_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.RAG_RETRIEVAL_WORKERS,
+                    thread_name_prefix="rag-retrieval",
+                )
+    return _executor
+
+
+def _get_semaphore():
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(settings.RAG_RETRIEVAL_CONCURRENCY)
+        _semaphores[loop] = semaphore
+    return semaphore
+
+
+def embed_query(query, embed_model=None):
+    cache = get_embedding_cache()
+    key = cache.make_key(query, settings.OPENAI_EMBED_MODEL)
+    embedding = cache.get(key)
+    if embedding is None:
+        if embed_model is None:
+            handles, _ = get_runtime().acquire()
+            embed_model = handles.embed_model
+        embedding = embed_model.get_query_embedding(query)
+        cache.set(key, embedding)
+    return embedding
+
+
+async def aembed_query(query):
+    """Embed a query on the event loop through the shared pooled client."""
+    cache = get_embedding_cache()
+    key = cache.make_key(query, settings.OPENAI_EMBED_MODEL)
+    embedding = cache.get_local(key)
+    if embedding is None:
+        if cache.has_remote:
+            loop = asyncio.get_running_loop()
+            embedding = await loop.run_in_executor(get_retrieval_executor(), cache.get_remote, key)
+        else:
+            embedding = cache.get_remote(key)
+    if embedding is None:
+        options = {}
+        if settings.OPENAI_EMBED_DIMENSIONS:
+            options["dimensions"] = settings.OPENAI_EMBED_DIMENSIONS
+        async with async_openai() as client:
+            # Same input normalisation as the llama-index embedding model.
+            response = await client.embeddings.create(
+                model=settings.OPENAI_EMBED_MODEL,
+                input=[query.replace("\n", " ")],
+                **options,
+            )
+        embedding = response.data[0].embedding
+        cache.set(key, embedding)
+    return embedding
+
+
+def _lexical_search(handles, query, top_k):
+    """Return ``(hits, confident)`` from the BM25 index of this generation."""
+    if not settings.RAG_LEXICAL_ENABLED:
+        return [], False
+    index = get_lexical_index(handles.generation)
+    if index is None:
+        return [], False
+    hits, confidence = index.search(query, top_k)
+    confident = bool(hits) and confidence >= settings.RAG_LEXICAL_CONFIDENCE and (
+        len(hits) == 1 or hits[0][2] >= hits[1][2] * settings.RAG_LEXICAL_MARGIN
+    )
+    if hits:
+        top = hits[0][2] or 1.0
+        hits = [(hit_id, text, score / top * confidence) for hit_id, text, score in hits]
+    return hits, confident
+
+
+def cosine_from_score(score):
+    """Cosine similarity from ChromaVectorStore's score.
+
+    The collection uses Chroma's default squared-L2 space and the store
+    reports exp(-distance); for unit-length OpenAI embeddings the distance
+    is 2 - 2 * cosine.
+    """
+    if not score or score <= 0:
+        return -1.0
+    return max(-1.0, min(1.0, 1.0 + math.log(score) / 2))
+
+
+def _vector_search(handles, query, embedding, top_k):
+    retriever = handles.index.as_retriever(similarity_top_k=top_k)
+    results = retriever.retrieve(QueryBundle(query_str=query, embedding=embedding))
+    return [
+        (result.node.node_id, result.node.get_content(), cosine_from_score(result.score)) for result in results
+    ]
+
+
+def _combine(vector_hits, lexical_hits, top_k):
+    if not lexical_hits:
+        return PATH_VECTOR, [RetrievedChunk(text, score) for _, text, score in vector_hits]
+    fused = reciprocal_rank_fusion(
+        [[(hit_id, text) for hit_id, text, _ in vector_hits], [(hit_id, text) for hit_id, text, _ in lexical_hits]],
+        top_k=top_k,
+    )
+    # Rank by fusion, but report each chunk's own relevance; the vector
+    # similarity wins when both paths found it.
+    relevance = {hit_id: score for hit_id, _, score in lexical_hits}
+    relevance.update((hit_id, score) for hit_id, _, score in vector_hits)
+    return PATH_FUSED, [RetrievedChunk(text, relevance[hit_id]) for hit_id, text, _ in fused]
+
+
+def filter_relevant(chunks, min_score=None):
+    """Drop chunks scoring below ``min_score`` (RAG_MIN_RELEVANCE by default)."""
+    min_score = settings.RAG_MIN_RELEVANCE if min_score is None else min_score
+    return [chunk for chunk in chunks if chunk.score >= min_score]
+
+
+def retrieve_context(query, top_k=5, embedding=None, min_score=None):
+    """Return up to ``top_k`` RetrievedChunks, best first, scoring at least
+    ``min_score``; empty when nothing in the corpus is relevant."""
     if not settings.OPENAI_API_KEY:
         return []
 
-    Settings.embed_model = OpenAIEmbedding(
-        api_key=settings.OPENAI_API_KEY,
-        model=settings.OPENAI_EMBED_MODEL,
-    )
-    vector_store = get_vector_store()
-    index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
-    retriever = index.as_retriever(similarity_top_k=top_k)
-    results = retriever.retrieve(query)
-    return [node.get_content() for node in results]
+    runtime = get_runtime()
+    started = time.perf_counter()
+    handles, cold = runtime.acquire()
+    lexical_hits, confident = _lexical_search(handles, query, top_k)
+    if confident:
+        path, chunks = PATH_LEXICAL, [RetrievedChunk(text, score) for _, text, score in lexical_hits]
+    else:
+        if embedding is None:
+            embedding = embed_query(query, embed_model=handles.embed_model)
+        vector_hits = _vector_search(handles, query, embedding, top_k)
+        path, chunks = _combine(vector_hits, lexical_hits, top_k)
+
+    elapsed = time.perf_counter() - started
+    runtime.observe(elapsed, cold)
+    retrieval_stats.record(path, elapsed)
+    return filter_relevant(chunks, min_score)
+
+
+async def aretrieve_context(query, top_k=5, embedding=None, min_score=None):
+    """Awaitable retrieve_context.
+
+    The embedding request runs on the event loop through the model's async
+    HTTP client; only the runtime acquire, the BM25 lookup and the vector
+    search are handed to the bounded retrieval executor.
+    RAG_RETRIEVAL_CONCURRENCY caps how many retrievals run at once per event
+    loop.
+    """
+    if not settings.OPENAI_API_KEY:
+        return []
+
+    runtime = get_runtime()
+    loop = asyncio.get_running_loop()
+    executor = get_retrieval_executor()
+    async with _get_semaphore():
+        started = time.perf_counter()
+        handles, cold = await loop.run_in_executor(executor, runtime.acquire)
+        lexical_hits, confident = await loop.run_in_executor(
+            executor, _lexical_search, handles, query, top_k
+        )
+        if confident:
+            path, chunks = PATH_LEXICAL, [RetrievedChunk(text, score) for _, text, score in lexical_hits]
+        else:
+            if embedding is None:
+                embedding = await aembed_query(query)
+            vector_hits = await loop.run_in_executor(
+                executor, _vector_search, handles, query, embedding, top_k
+            )
+            path, chunks = _combine(vector_hits, lexical_hits, top_k)
+
+        elapsed = time.perf_counter() - started
+        runtime.observe(elapsed, cold)
+        retrieval_stats.record(path, elapsed)
+    return filter_relevant(chunks, min_score)
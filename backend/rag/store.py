@@ -1,17 +1,211 @@
+import fcntl
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
 import chromadb
 from django.conf import settings
-from llama_index.core import StorageContext
+from llama_index.core import StorageContext, VectorStoreIndex
+from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.vector_stores.chroma import ChromaVectorStore
 
+from core.openai_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "website_docs"
+GENERATION_FILENAME = ".generation"
+
+RuntimeHandles = namedtuple(
+    "RuntimeHandles",
+    ["client", "collection", "vector_store", "embed_model", "index", "generation"],
+)
+
+
+def _generation_path():
+    return os.path.join(settings.CHROMA_PERSIST_DIR, GENERATION_FILENAME)
+
+
+def get_generation():
+    try:
+        with open(_generation_path()) as handle:
+            return int(handle.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def bump_generation():
+    """Mark the collection as changed so every process rebuilds its runtime.
+
+    The read and increment happen under an exclusive lock on a sidecar file,
+    so two ingests finishing together get two distinct generations.
+    """
+    os.makedirs(settings.CHROMA_PERSIST_DIR, exist_ok=True)
+    path = _generation_path()
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        generation = get_generation() + 1
+        fd, tmp_path = tempfile.mkstemp(dir=settings.CHROMA_PERSIST_DIR, prefix=f"{GENERATION_FILENAME}.")
+        try:
+            with os.fdopen(fd, "w") as handle:
+                handle.write(str(generation))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    return generation
+
+
+def build_embed_model(max_retries=None):
+    """OpenAIEmbedding on the shared connection pool.
+
+    llama-index retries failed calls itself (ten times by default); this
+    uses OPENAI_MAX_RETRIES unless ``max_retries`` says otherwise.
+    """
+    options = {}
+    if settings.OPENAI_EMBED_DIMENSIONS:
+        options["dimensions"] = settings.OPENAI_EMBED_DIMENSIONS
+    if settings.OPENAI_SHARED_CLIENT:
+        options["http_client"] = get_http_client()
+    return OpenAIEmbedding(
+        api_key=settings.OPENAI_API_KEY,
+        api_base=settings.OPENAI_BASE_URL,
+        model=settings.OPENAI_EMBED_MODEL,
+        embed_batch_size=settings.RAG_EMBED_BATCH_SIZE,
+        max_retries=settings.OPENAI_MAX_RETRIES if max_retries is None else max_retries,
+        **options,
+    )
+
+
+class VectorRuntime:
+    """Process-wide Chroma client, embedding model and index.
+
+    Handles are built on first use and shared by every thread in the process
+    (the ASGI executor threads and the Celery worker alike). They are rebuilt
+    after a fork and whenever another process bumps the corpus generation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._handles = None
+        self._embed_model = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "builds": 0,
+            "refreshes": 0,
+            "cold_start_seconds": None,
+            "cold_calls": 0,
+            "cold_seconds_total": 0.0,
+            "warm_calls": 0,
+            "warm_seconds_total": 0.0,
+            "warm_seconds_max": 0.0,
+        }
+
+    def acquire(self):
+        """Return current handles and whether this call paid for a (re)build."""
+        generation = get_generation()
+        handles = self._handles
+        if handles is not None and self._pid == os.getpid() and handles.generation == generation:
+            return handles, False
+
+        with self._lock:
+            handles = self._handles
+            if self._pid != os.getpid():
+                self._embed_model = None
+                handles = None
+            if handles is None or handles.generation != generation:
+                handles = self._build(generation, refresh=handles is not None)
+            return handles, True
+
+    def _build(self, generation, refresh=False):
+        started = time.perf_counter()
+        if self._embed_model is None:
+            self._embed_model = build_embed_model()
+
+        client = chromadb.PersistentClient(path=settings.CHROMA_PERSIST_DIR)
+        collection = client.get_or_create_collection(COLLECTION_NAME)
+        vector_store = ChromaVectorStore(chroma_collection=collection)
+        index = VectorStoreIndex.from_vector_store(
+            vector_store=vector_store,
+            embed_model=self._embed_model,
+        )
+        handles = RuntimeHandles(
+            client=client,
+            collection=collection,
+            vector_store=vector_store,
+            embed_model=self._embed_model,
+            index=index,
+            generation=generation,
+        )
+        self._handles = handles
+        self._pid = os.getpid()
+
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self._stats["refreshes" if refresh else "builds"] += 1
+            if not refresh:
+                self._stats["cold_start_seconds"] = elapsed
+        logger.info(
+            "Vector runtime %s in %.3fs (generation %s)",
+            "refreshed" if refresh else "built",
+            elapsed,
+            generation,
+        )
+        return handles
+
+    def observe(self, seconds, cold):
+        with self._stats_lock:
+            if cold:
+                self._stats["cold_calls"] += 1
+                self._stats["cold_seconds_total"] += seconds
+            else:
+                self._stats["warm_calls"] += 1
+                self._stats["warm_seconds_total"] += seconds
+                self._stats["warm_seconds_max"] = max(self._stats["warm_seconds_max"], seconds)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["generation"] = self._handles.generation if self._handles else None
+        stats["cold_seconds_avg"] = (
+            stats["cold_seconds_total"] / stats["cold_calls"] if stats["cold_calls"] else None
+        )
+        stats["warm_seconds_avg"] = (
+            stats["warm_seconds_total"] / stats["warm_calls"] if stats["warm_calls"] else None
+        )
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._handles = None
+            self._embed_model = None
+            self._pid = None
+
+
+runtime = VectorRuntime()
+
+
+def get_runtime():
+    return runtime
+
+
+def get_embed_model():
+    handles, _ = runtime.acquire()
+    return handles.embed_model
+
 
 def get_chroma_collection():
-    client = chromadb.PersistentClient(path=settings.CHROMA_PERSIST_DIR)
-    return client.get_or_create_collection("website_docs")
+    handles, _ = runtime.acquire()
+    return handles.collection
 
 
 def get_vector_store():
-    collection = get_chroma_collection()
-    return ChromaVectorStore(chroma_collection=collection)
+    handles, _ = runtime.acquire()
+    return handles.vector_store
 
 
 def get_storage_context():
@@ -1,3 +1,255 @@
-from django.test import TestCase
+import gzip
+import json
+import math
+import os
+import tempfile
+import threading
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from rag.lexical import LEXICAL_INDEX_FILENAME, BM25Index, build_lexical_index, reciprocal_rank_fusion, tokenize
+from rag.packing import pack_context
+from rag.retrieval import (
+    PATH_FUSED,
+    PATH_LEXICAL,
+    RetrievedChunk,
+    _combine,
+    cosine_from_score,
+    filter_relevant,
+    retrieve_context,
+)
+from rag.store import bump_generation, get_generation
+from rag.tokens import count_tokens
+
+
+def passage(start, end, prefix="word"):
+    return " ".join(f"{prefix}{index}" for index in range(start, end))
+
+
+class PackContextTests(SimpleTestCase):
+    def test_split_overlap_is_trimmed(self):
+        first = passage(0, 100)
+        second = passage(80, 180)
+
+        packed, stats = pack_context([first, second], budget=10000)
+
+        self.assertEqual(packed, [first, passage(100, 180)])
+        self.assertLess(stats["tokens_after"], stats["tokens_before"])
+
+    def test_overlap_before_a_kept_chunk_is_trimmed(self):
+        packed, _ = pack_context([passage(100, 200), passage(50, 120)], budget=10000)
+
+        self.assertEqual(packed[1], passage(50, 100))
+
+    def test_near_duplicates_are_dropped(self):
+        original = passage(0, 200)
+        copy = original.replace("word57 ", "changed ")
+
+        packed, stats = pack_context([original, passage(0, 50, "other"), copy], budget=10000)
+
+        self.assertEqual(packed, [original, passage(0, 50, "other")])
+        self.assertEqual(stats["duplicates"], 1)
+
+    def test_budget_is_filled_in_relevance_order(self):
+        best, large, small = passage(0, 60, "a"), passage(0, 200, "b"), passage(0, 20, "c")
+        budget = count_tokens(best) + count_tokens(small) + 10
+
+        packed, stats = pack_context([best, large, small], budget=budget)
+
+        self.assertEqual(packed, [best, small])
+        self.assertEqual(stats["over_budget"], 1)
+        self.assertLessEqual(stats["tokens_after"], budget)
+
+    def test_an_oversized_best_chunk_is_truncated(self):
+        packed, stats = pack_context([passage(0, 500)], budget=50)
+
+        self.assertEqual(len(packed), 1)
+        self.assertLessEqual(stats["tokens_after"], 50)
+
+
+class RelevanceTests(SimpleTestCase):
+    def test_chroma_scores_convert_back_to_cosine(self):
+        for cosine in (1.0, 0.5, 0.0):
+            score = math.exp(-(2 - 2 * cosine))
+            self.assertAlmostEqual(cosine_from_score(score), cosine)
+
+    def test_fused_chunks_keep_their_own_relevance(self):
+        vector_hits = [("a", "alpha", 0.6), ("b", "beta", 0.1)]
+        lexical_hits = [("c", "gamma", 0.4), ("a", "alpha", 0.9)]
+
+        _, chunks = _combine(vector_hits, lexical_hits, top_k=3)
+
+        self.assertEqual(chunks[0], RetrievedChunk("alpha", 0.6))
+        self.assertEqual(
+            filter_relevant(chunks, min_score=0.25),
+            [RetrievedChunk("alpha", 0.6), RetrievedChunk("gamma", 0.4)],
+        )
+
+
+class FakeCollection:
+    def __init__(self, texts):
+        self.ids = [f"chunk-{index}" for index in range(len(texts))]
+        self.texts = list(texts)
+
+    def get(self, include=None, limit=None, offset=0):
+        stop = len(self.ids) if limit is None else offset + limit
+        return {"ids": self.ids[offset:stop], "documents": self.texts[offset:stop]}
+
+
+class PersistDirTestCase(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(CHROMA_PERSIST_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class GenerationTests(PersistDirTestCase):
+    def test_concurrent_bumps_each_get_their_own_generation(self):
+        barrier = threading.Barrier(8)
+        generations = []
+
+        def bump():
+            barrier.wait()
+            for _ in range(25):
+                generations.append(bump_generation())
+
+        threads = [threading.Thread(target=bump) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(generations), list(range(1, 201)))
+        self.assertEqual(get_generation(), 200)
+
+
+class LexicalIndexTests(PersistDirTestCase):
+
+    def test_concurrent_rebuilds_do_not_collide(self):
+        collection = FakeCollection([passage(0, 2000, f"doc{index}-") for index in range(20)])
+        barrier = threading.Barrier(4)
+        errors = []
+
+        def rebuild():
+            barrier.wait()
+            try:
+                build_lexical_index(collection, page_size=5)
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=rebuild) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(os.listdir(self.directory), [LEXICAL_INDEX_FILENAME])
+        with gzip.open(os.path.join(self.directory, LEXICAL_INDEX_FILENAME), "rt", encoding="utf-8") as handle:
+            self.assertEqual(len(BM25Index.from_dict(json.load(handle))), 20)
+
+
+CORPUS = [
+    "Error E-1042 means the vault token expired; renew the vault token.",
+    "Error E-2001 means the disk is full.",
+    "The vault stores secrets for every service.",
+    "Rotate service tokens every ninety days.",
+    "Backups run nightly and are kept for a month.",
+]
+
+
+class BM25Tests(SimpleTestCase):
+    def setUp(self):
+        self.index = BM25Index.build([f"chunk-{index}" for index in range(len(CORPUS))], CORPUS)
+
+    def test_codes_are_single_tokens(self):
+        self.assertEqual(tokenize("See E-1042 in v2.3"), ["see", "e-1042", "in", "v2.3"])
+
+    def test_exact_code_ranks_its_chunk_first_with_full_confidence(self):
+        hits, confidence = self.index.search("E-1042", top_k=3)
+
+        self.assertEqual([hit_id for hit_id, _, _ in hits], ["chunk-0"])
+        self.assertGreater(confidence, 0.8)
+
+    def test_rare_terms_outweigh_common_ones(self):
+        hits, _ = self.index.search("error disk", top_k=3)
+
+        self.assertEqual(hits[0][0], "chunk-1")
+        self.assertGreater(hits[0][2], hits[1][2])
+
+    def test_unknown_query_terms_lower_confidence(self):
+        _, exact = self.index.search("E-1042", top_k=3)
+        _, question = self.index.search("What does E-1042 mean?", top_k=3)
+
+        self.assertLess(question, exact)
+
+    def test_fusion_prefers_chunks_both_rankings_agree_on(self):
+        vector = [("a", "A"), ("b", "B"), ("c", "C")]
+        lexical = [("b", "B"), ("d", "D")]
+
+        fused = reciprocal_rank_fusion([vector, lexical], top_k=3)
+
+        self.assertEqual([item_id for item_id, _, _ in fused], ["b", "a", "d"])
+
+
+@override_settings(
+    OPENAI_API_KEY="test",
+    RAG_LEXICAL_ENABLED=True,
+    RAG_LEXICAL_CONFIDENCE=0.8,
+    RAG_LEXICAL_MARGIN=1.5,
+)
+class LexicalFastPathTests(SimpleTestCase):
+    def setUp(self):
+        index = BM25Index.build([f"chunk-{index}" for index in range(len(CORPUS))], CORPUS)
+        handles = SimpleNamespace(generation=1, embed_model=None)
+        runtime = mock.Mock()
+        runtime.acquire.return_value = (handles, False)
+        patches = [
+            mock.patch("rag.retrieval.get_runtime", return_value=runtime),
+            mock.patch("rag.retrieval.get_lexical_index", return_value=index),
+            mock.patch("rag.retrieval.embed_query", return_value=[0.0]),
+            mock.patch("rag.retrieval._vector_search"),
+            mock.patch("rag.retrieval.retrieval_stats"),
+        ]
+        mocks = [patcher.start() for patcher in patches]
+        for patcher in patches:
+            self.addCleanup(patcher.stop)
+        _, _, self.embed_query, self.vector_search, self.stats = mocks
+
+    def path(self):
+        return self.stats.record.call_args[0][0]
+
+    def test_a_confident_exact_match_skips_the_vector_query(self):
+        chunks = retrieve_context("E-1042", min_score=0)
+
+        self.assertEqual(self.path(), PATH_LEXICAL)
+        self.assertEqual(chunks[0].text, CORPUS[0])
+        self.embed_query.assert_not_called()
+        self.vector_search.assert_not_called()
+
+    def test_a_narrow_lead_goes_through_fusion(self):
+        # "error" matches two chunks with close scores: confident, but not by the margin.
+        self.vector_search.return_value = [
+            ("chunk-1", CORPUS[1], 0.6),
+            ("chunk-3", CORPUS[3], 0.3),
+            ("chunk-0", CORPUS[0], 0.3),
+        ]
+
+        chunks = retrieve_context("error", min_score=0)
+
+        self.assertEqual(self.path(), PATH_FUSED)
+        self.vector_search.assert_called_once()
+        self.assertEqual([chunk.text for chunk in chunks[:2]], [CORPUS[1], CORPUS[0]])
+
+    def test_questions_with_words_outside_the_corpus_use_both_paths(self):
+        self.vector_search.return_value = [("chunk-2", CORPUS[2], 0.5), ("chunk-0", CORPUS[0], 0.45)]
+
+        chunks = retrieve_context("What does E-1042 mean?", min_score=0)
+
+        self.assertEqual(self.path(), PATH_FUSED)
+        self.assertEqual(chunks[0].text, CORPUS[0])
@@ -0,0 +1,61 @@
+"""Token counting for prompt budgets.
+
+Uses the tiktoken encoding of OPENAI_CHAT_MODEL. tiktoken downloads its
+encoding files on first use; where that is not possible the counts fall
+back to an estimate of four characters per token, which is close enough
+to keep prompts bounded.
+"""
+
+import logging
+import math
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+
+_lock = threading.Lock()
+_encodings = {}
+
+
+def get_encoding(model=None):
+    """The tiktoken encoding for ``model``, or None if it cannot be loaded."""
+    model = model or settings.OPENAI_CHAT_MODEL
+    with _lock:
+        if model not in _encodings:
+            try:
+                import tiktoken
+
+                try:
+                    encoding = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    encoding = tiktoken.get_encoding("o200k_base")
+            except Exception as exc:
+                logger.warning("No tiktoken encoding for %s (%s); estimating token counts", model, exc)
+                encoding = None
+            _encodings[model] = encoding
+        return _encodings[model]
+
+
+def count_tokens(text, model=None):
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, limit, model=None):
+    """Cut ``text`` down to at most ``limit`` tokens."""
+    if limit <= 0 or not text:
+        return ""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[: limit * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= limit:
+        return text
+    return encoding.decode(tokens[:limit])
@@ -120,16 +120,29 @@ export function getWebSocketUrl(path: string) {
   return `${base}${path}`
 }
 
+export type DocumentStatus = 'queued' | 'parsing' | 'embedding' | 'indexed' | 'failed'
+
+export interface DocumentProgress {
+  id: number
+  status: DocumentStatus
+  error: string
+  pages_total: number
+  pages_processed: number
+  chunks_processed: number
+  chunk_count: number
+  stage_durations: Record<string, number>
+}
+
+export interface DocumentItem extends DocumentProgress {
+  title: string
+  file: string
+  processing_started_at: string | null
+  processed_at: string | null
+  created_at: string
+}
+
 export async function apiFetchDocuments() {
-  return apiRequest<
-    Array<{
-      id: number
-      title: string
-      file: string
-      processed: boolean
-      created_at: string
-    }>
-  >('/api/documents/')
+  return apiRequest<DocumentItem[]>('/api/documents/')
 }
 
 export async function apiUploadDocument(title: string, file: File) {
@@ -149,20 +162,47 @@ export async function apiDeleteDocument(id: number) {
   })
 }
 
-export async function apiFetchChatSessions() {
+export interface Page<T> {
+  next: string | null
+  previous: string | null
+  results: T[]
+}
+
+// Sessions come in cursor pages; pass the cursor from a previous page's `next`.
+export async function apiFetchChatSessions(cursor?: string | null) {
+  const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''
   return apiRequest<
-    Array<{
+    Page<{
       id: number
       created_at: string
       last_message?: { role: string; content: string; timestamp: string } | null
     }>
-  >('/api/chat/sessions/')
+  >(`/api/chat/sessions/${query}`)
+}
+
+export function nextCursor(next: string | null) {
+  return next ? new URL(next).searchParams.get('cursor') : null
 }
 
+export interface ChatMessageItem {
+  id: number
+  role: string
+  content: string
+  timestamp: string
+}
+
+// The detail carries only the latest page of messages; older ones are
+// fetched from `messages_next` with apiFetchChatMessages.
 export async function apiFetchChatSessionDetail(id: number) {
   return apiRequest<{
     id: number
     created_at: string
-    messages: Array<{ id: number; role: string; content: string; timestamp: string }>
+    messages: ChatMessageItem[]
+    messages_next: string | null
   }>(`/api/chat/sessions/${id}/`)
 }
+
+export async function apiFetchChatMessages(sessionId: number, cursor?: string | null) {
+  const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''
+  return apiRequest<Page<ChatMessageItem>>(`/api/chat/sessions/${sessionId}/messages/${query}`)
+}
@@ -66,7 +66,12 @@ export default function ChatWidget() {
                     setSessionId(payload.session_id)
                     return
                 }
+                if (payload.type === 'status' && payload.message === 'queued') {
+                    setStatus(`queued · position ${payload.position}`)
+                    return
+                }
                 if (payload.type === 'delta') {
+                    setStatus((prev) => (prev.startsWith('queued') ? '' : prev))
                     setMessages((prev) => {
                         const next = [...prev]
                         const last = next[next.length - 1]
@@ -85,7 +90,11 @@ export default function ChatWidget() {
                 }
                 if (payload.type === 'error') {
                     setIsStreaming(false)
-                    setStatus(payload.error)
+                    setStatus(
+                        payload.retry_after
+                            ? `${payload.error} · retry in ${payload.retry_after}s`
+                            : payload.error,
+                    )
                 }
             } catch {
                 setStatus('invalid_message')
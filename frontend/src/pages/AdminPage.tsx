@@ -1,13 +1,30 @@
 import { useEffect, useRef, useState } from 'react'
 
-import { apiDeleteDocument, apiFetchDocuments, apiUploadDocument } from '../api/client'
+import {
+  apiDeleteDocument,
+  apiFetchDocuments,
+  apiUploadDocument,
+  getWebSocketUrl,
+  tokenStore,
+} from '../api/client'
+import type { DocumentItem, DocumentProgress } from '../api/client'
 
-interface DocumentItem {
-  id: number
-  title: string
-  file: string
-  processed: boolean
-  created_at: string
+const STATUS_LABELS: Record<DocumentItem['status'], string> = {
+  queued: 'Queued',
+  parsing: 'Parsing',
+  embedding: 'Embedding',
+  indexed: 'Indexed',
+  failed: 'Failed',
+}
+
+function describeProgress(doc: DocumentItem) {
+  if (doc.status === 'indexed') {
+    return `${doc.chunk_count} chunks`
+  }
+  if (doc.status === 'parsing' || doc.status === 'embedding') {
+    return `${doc.pages_processed}/${doc.pages_total} pages · ${doc.chunks_processed} chunks`
+  }
+  return ''
 }
 
 export default function AdminPage() {
@@ -31,6 +48,25 @@ export default function AdminPage() {
     loadDocuments()
   }, [])
 
+  useEffect(() => {
+    const url = new URL(getWebSocketUrl('/ws/documents/'))
+    const token = tokenStore.getAccessToken()
+    if (token) {
+      url.searchParams.set('token', token)
+    }
+    const socket = new WebSocket(url.toString())
+    socket.onmessage = (event) => {
+      const payload = JSON.parse(event.data) as { type: string; document: DocumentProgress }
+      if (payload.type !== 'progress') {
+        return
+      }
+      setDocuments((prev) =>
+        prev.map((doc) => (doc.id === payload.document.id ? { ...doc, ...payload.document } : doc)),
+      )
+    }
+    return () => socket.close()
+  }, [])
+
   const handleUpload = async () => {
     const file = fileRef.current?.files?.[0]
     if (!file || !title.trim()) {
@@ -115,9 +151,13 @@ export default function AdminPage() {
               <div>
                 <p className="text-base font-semibold text-white">{doc.title}</p>
                 <p className="text-xs text-slate-400">
-                  {doc.processed ? 'Processed' : 'Processing'} ·{' '}
+                  {STATUS_LABELS[doc.status]}
+                  {describeProgress(doc) ? ` · ${describeProgress(doc)}` : ''} ·{' '}
                   {new Date(doc.created_at).toLocaleString()}
                 </p>
+                {doc.status === 'failed' && doc.error ? (
+                  <p className="mt-1 text-xs text-rose-400">{doc.error}</p>
+                ) : null}
               </div>
               <button
                 onClick={() => handleDelete(doc.id)}
@@ -1,6 +1,7 @@
 import { useEffect, useState } from 'react'
 
-import { apiFetchChatSessionDetail, apiFetchChatSessions } from '../api/client'
+import { apiFetchChatMessages, apiFetchChatSessionDetail, apiFetchChatSessions, nextCursor } from '../api/client'
+import type { ChatMessageItem } from '../api/client'
 
 interface ChatSessionListItem {
   id: number
@@ -11,12 +12,16 @@ interface ChatSessionListItem {
 interface ChatSessionDetail {
   id: number
   created_at: string
-  messages: Array<{ id: number; role: string; content: string; timestamp: string }>
+  messages: ChatMessageItem[]
+  messages_next: string | null
 }
 
 export default function ChatHistoryPage() {
   const [sessions, setSessions] = useState<ChatSessionListItem[]>([])
   const [selected, setSelected] = useState<ChatSessionDetail | null>(null)
+  const [cursor, setCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const [loadingOlder, setLoadingOlder] = useState(false)
   const [error, setError] = useState('')
 
   useEffect(() => {
@@ -24,9 +29,10 @@ export default function ChatHistoryPage() {
       setError('')
       try {
         const data = await apiFetchChatSessions()
-        setSessions(data)
-        if (data.length > 0) {
-          const detail = await apiFetchChatSessionDetail(data[0].id)
+        setSessions(data.results)
+        setCursor(nextCursor(data.next))
+        if (data.results.length > 0) {
+          const detail = await apiFetchChatSessionDetail(data.results[0].id)
           setSelected(detail)
         }
       } catch (err) {
@@ -37,6 +43,40 @@ export default function ChatHistoryPage() {
     loadSessions()
   }, [])
 
+  const handleLoadMore = async () => {
+    if (!cursor) return
+    setError('')
+    setLoadingMore(true)
+    try {
+      const data = await apiFetchChatSessions(cursor)
+      setSessions((current) => [...current, ...data.results])
+      setCursor(nextCursor(data.next))
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'Failed to load sessions')
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
+  const handleLoadOlder = async () => {
+    const cursor = nextCursor(selected?.messages_next ?? null)
+    if (!selected || !cursor) return
+    setError('')
+    setLoadingOlder(true)
+    try {
+      const data = await apiFetchChatMessages(selected.id, cursor)
+      setSelected((current) =>
+        current && current.id === selected.id
+          ? { ...current, messages: [...data.results, ...current.messages], messages_next: data.next }
+          : current,
+      )
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'Failed to load messages')
+    } finally {
+      setLoadingOlder(false)
+    }
+  }
+
   const handleSelect = async (sessionId: number) => {
     setError('')
     try {
@@ -81,12 +121,30 @@ export default function ChatHistoryPage() {
                 </button>
               ))
             )}
+            {cursor ? (
+              <button
+                onClick={handleLoadMore}
+                disabled={loadingMore}
+                className="w-full rounded-2xl border border-slate-800 px-4 py-2 text-xs text-slate-300 transition hover:border-slate-600 disabled:opacity-50"
+              >
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </button>
+            ) : null}
           </div>
         </div>
 
         <div className="rounded-3xl border border-slate-800 bg-slate-900/70 p-6">
           <h2 className="text-sm font-semibold text-slate-200">Conversation</h2>
           <div className="mt-4 flex h-[420px] flex-col gap-3 overflow-y-auto rounded-2xl bg-slate-950/70 p-4">
+            {selected?.messages_next ? (
+              <button
+                onClick={handleLoadOlder}
+                disabled={loadingOlder}
+                className="mx-auto rounded-full border border-slate-800 px-4 py-1 text-xs text-slate-400 transition hover:border-slate-600 disabled:opacity-50"
+              >
+                {loadingOlder ? 'Loading...' : 'Load earlier messages'}
+              </button>
+            ) : null}
             {selected?.messages?.length ? (
               selected.messages.map((msg) => (
                 <div